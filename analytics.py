@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+# Rep ranges for the breakdown, as (label, lowest reps, highest reps)
+REP_RANGES = [
+    ('Strength (1-5)', 1, 5),
+    ('Hypertrophy (6-12)', 6, 12),
+    ('Endurance (13+)', 13, np.inf)
+]
+
+KEYS = ['Workout', 'Exercise']
+
+def prepare_history(history_df):
+    """Add parsed dates, volume and estimated 1RM columns to a history frame"""
+    history = history_df.copy()
+    history['Date'] = pd.to_datetime(history['Date'])
+    # History reads carry the volume, exact for entries logged per set
+    if 'Volume' not in history:
+        history['Volume'] = history['Sets'] * history['Reps'] * history['Weight']
+
+    reps = history['Reps'].to_numpy(dtype=float)
+    weight = history['Weight'].to_numpy(dtype=float)
+    single = reps <= 1
+    history['Epley'] = np.where(single, weight, weight * (1 + reps / 30))
+    # Brzycki is undefined from 37 reps on
+    with np.errstate(divide='ignore', invalid='ignore'):
+        history['Brzycki'] = np.where(single, weight, np.where(reps < 37, weight * 36 / (37 - reps), np.nan))
+
+    # Every grouping below wants the rows of an exercise in date order
+    return history.sort_values(KEYS + ['Date'], kind='stable', ignore_index=True)
+
+def running_records(history):
+    """Get the running best weight and estimated 1RM per exercise, flagging new PRs"""
+    records = history[KEYS + ['Date', 'Weight', 'Epley', 'Brzycki']].copy()
+    grouped = records.groupby(KEYS, sort=False)
+    records['BestWeight'] = grouped['Weight'].cummax()
+    records['BestE1RM'] = grouped['Epley'].cummax()
+
+    # A PR beats the best of all earlier rows of the same exercise
+    previous_best = records.groupby(KEYS, sort=False)['BestWeight'].shift()
+    records['IsPR'] = previous_best.isna() | (records['Weight'] > previous_best)
+    return records
+
+def rep_range_breakdown(history):
+    """Get the sessions and volume per rep range for every exercise"""
+    edges = [low - 0.5 for _, low, _ in REP_RANGES] + [np.inf]
+    labels = [label for label, _, _ in REP_RANGES]
+    ranges = pd.cut(history['Reps'], bins=edges, labels=labels).rename('RepRange')
+    return (
+        history.groupby(KEYS + [ranges], observed=True, sort=True)
+        .agg(Sessions=('Volume', 'size'), Volume=('Volume', 'sum'))
+        .reset_index()
+    )
+
+def compute_dashboard(history_df):
+    """Compute the records and rep ranges of every exercise of a history frame in one call
+
+    Volume per week or month comes from DataHandler.get_history_buckets.
+    """
+    if history_df is None or history_df.empty:
+        return None
+
+    history = prepare_history(history_df)
+    records = running_records(history)
+    return {
+        'history': history,
+        'records': records,
+        'latest_records': records.groupby(KEYS, sort=False).tail(1).reset_index(drop=True),
+        'rep_ranges': rep_range_breakdown(history)
+    }
@@ -0,0 +1,354 @@
+"""Local HTTP/JSON API to log and read workouts without the Streamlit UI
+
+    GET  /exercises                            the workouts and their exercises
+    GET  /days/<date>[?workout=&exercise=]     last, current, max and best per exercise
+    POST /days/<date>                          save a day's entries, deletes and maxes at once
+    GET  /days/<date>/sets?workout=&exercise=  the sets of one entry
+    GET  /history?workout=&exercise=&start=&end=&limit=&offset=&order=asc|desc
+    GET  /history/buckets?period=week|month&workout=&exercise=&start=&end=
+
+Dates are ISO (YYYY-MM-DD) or DD/MM/YYYY. A POST body looks like
+
+    {"entries": [{"workout": "Push", "exercise": "Bench", "sets": 3, "reps": 8, "weight": 60}],
+     "deletes": [{"workout": "Push", "exercise": "Fly-overs"}],
+     "maxes": [{"workout": "Push", "exercise": "Bench", "max": 80}]}
+
+and is written in one transaction. An entry can log its sets one by one
+instead, its sets, reps and weight are then rolled up from them:
+
+    {"workout": "Push", "exercise": "Bench", "sets": [{"reps": 8, "weight": 60, "rpe": 8}, {"reps": 12, "weight": 40}]}
+
+Alongside the Streamlit app, start the API in the app's process with
+GYM_API_PORT so both share one DataHandler: a write through it only expires
+the cached reads it touched, a write from another process expires them all.
+"""
+
+import argparse
+import http.client
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlencode, urlsplit
+
+from data_handler import WriteBatch
+from workout_sets import MAX_REPS, MAX_WEIGHT, WorkoutSet
+from dates import from_day, to_day
+
+class ApiError(Exception):
+    """A request the API refuses, sent back as {"error": message} with status"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _entry_json(entry):
+    if entry is None:
+        return None
+    return {'date': entry.date.isoformat(), 'sets': entry.sets, 'reps': entry.reps, 'weight': entry.weight}
+
+def _day(value):
+    try:
+        return to_day(value)
+    except ValueError as error:
+        raise ApiError(400, str(error))
+
+def _number(item, name, kind, minimum, maximum):
+    value = item.get(name)
+    # JSON true/false are ints to Python, json.loads takes NaN, Infinity and ints
+    # of any size, all of which fail the range check
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not minimum <= value <= maximum:
+        raise ApiError(400, f"'{name}' must be a number from {minimum} to {maximum}, got {value!r}")
+    if kind is int and value != int(value):
+        raise ApiError(400, f"'{name}' must be a whole number, got {value!r}")
+    return kind(value)
+
+def _items(body, name):
+    """Get a list of a POST body, which may leave it out"""
+    items = body.get(name, [])
+    if not isinstance(items, list):
+        raise ApiError(400, f"'{name}' must be a list, got {items!r}")
+    return items
+
+def _set_json(workout_set):
+    return {'reps': workout_set.reps, 'weight': workout_set.weight, 'rpe': workout_set.rpe}
+
+def _sets(item):
+    """Get the WorkoutSet list of an entry logged per set"""
+    sets = []
+    for set_item in item['sets']:
+        if not isinstance(set_item, dict):
+            raise ApiError(400, f"Expected a set object with reps and weight, got {set_item!r}")
+        rpe = _number(set_item, 'rpe', float, 1, 10) if set_item.get('rpe') is not None else None
+        sets.append(WorkoutSet(_number(set_item, 'reps', int, 1, MAX_REPS), _number(set_item, 'weight', float, 0, MAX_WEIGHT), rpe))
+    if not sets:
+        raise ApiError(400, "'sets' must list at least one set, delete the entry instead")
+    return sets
+
+class WorkoutApi:
+    """The API's operations on a DataHandler, in and out as plain JSON data"""
+    def __init__(self, data_handler):
+        self.data_handler = data_handler
+
+    def _names(self, item):
+        """Get a known (workout, exercise) from a JSON object"""
+        if not isinstance(item, dict):
+            raise ApiError(400, f"Expected an object with a workout and exercise, got {item!r}")
+        workout, exercise = item.get('workout'), item.get('exercise')
+        if not isinstance(workout, str) or not isinstance(exercise, str):
+            raise ApiError(400, f"'workout' and 'exercise' must be names, got {workout!r} and {exercise!r}")
+        catalog = self.data_handler.catalog
+        if catalog.ids(workout, exercise) is None:
+            # Another process may have added it since the catalog was loaded
+            catalog = self.data_handler.refresh_catalog()
+        if catalog.ids(workout, exercise) is None:
+            # Exercise names are unique, so a known one is listed under another workout
+            owner = catalog.exercise_workouts.get(exercise)
+            if owner is not None:
+                raise ApiError(400, f"Exercise '{exercise}' belongs to workout '{owner}', not '{workout}'")
+            raise ApiError(400, f"Unknown exercise '{exercise}' of workout '{workout}'")
+        return workout, exercise
+
+    def exercises(self, query):
+        return {'workouts': {workout: list(exercises) for workout, exercises in self.data_handler.catalog.exercises_by_workout.items()}}
+
+    def day(self, date, query):
+        day = _day(date)
+        snapshot = self.data_handler.get_day_snapshot(day, query.get('workout'), query.get('exercise'))
+        return {
+            'date': from_day(day).isoformat(),
+            'exercises': [
+                {
+                    'workout': workout,
+                    'exercise': exercise,
+                    'last': _entry_json(entry['Last']),
+                    'current': _entry_json(entry['Current']),
+                    'max': entry['Max'],
+                    'best': entry['Best']
+                }
+                for (workout, exercise), entry in snapshot.items()
+            ]
+        }
+
+    def save_day(self, date, body):
+        """Validate everything first, so a bad item leaves the whole day unwritten"""
+        day = _day(date)
+        if not isinstance(body, dict):
+            raise ApiError(400, "The body must be a JSON object")
+
+        batch = WriteBatch()
+        for item in _items(body, 'entries'):
+            workout, exercise = self._names(item)
+            if isinstance(item.get('sets'), list):
+                try:
+                    batch.save_sets(day, workout, exercise, _sets(item))
+                except ValueError as error:
+                    raise ApiError(400, str(error))
+            else:
+                batch.save_workout(day, workout, exercise, _number(item, 'sets', int, 1, MAX_REPS),
+                                   _number(item, 'reps', int, 1, MAX_REPS), _number(item, 'weight', float, 0, MAX_WEIGHT))
+        for item in _items(body, 'deletes'):
+            batch.delete_workout(day, *self._names(item))
+        for item in _items(body, 'maxes'):
+            workout, exercise = self._names(item)
+            batch.save_max(workout, exercise, _number(item, 'max', float, 0, MAX_WEIGHT))
+        return {'date': from_day(day).isoformat(), 'changes': self.data_handler.apply_batch(batch)}
+
+    def sets(self, date, query):
+        day = _day(date)
+        workout, exercise = self._names(query)
+        sets = self.data_handler.get_sets(day, workout, exercise)
+        return {'date': from_day(day).isoformat(), 'workout': workout, 'exercise': exercise, 'sets': [_set_json(workout_set) for workout_set in sets]}
+
+    def history(self, query):
+        order = query.get('order', 'desc')
+        if order not in ('asc', 'desc'):
+            raise ApiError(400, "'order' must be 'asc' or 'desc'")
+        try:
+            limit = int(query['limit']) if 'limit' in query else None
+            offset = int(query.get('offset', 0))
+        except ValueError:
+            raise ApiError(400, "'limit' and 'offset' must be whole numbers")
+
+        columns = self.data_handler.get_history_columns(
+            query.get('workout'),
+            query.get('exercise'),
+            start=_day(query['start']) if 'start' in query else None,
+            end=_day(query['end']) if 'end' in query else None,
+            limit=limit,
+            offset=offset,
+            ascending=order == 'asc'
+        )
+        if columns is None:
+            return {'rows': []}
+        # Whole columns are converted at once, not value by value
+        dates = columns.days.astype('datetime64[D]').astype(str).tolist()
+        return {
+            'rows': [
+                {'date': date, 'workout': workout, 'exercise': exercise, 'sets': sets, 'reps': reps, 'weight': weight, 'volume': volume}
+                for date, workout, exercise, sets, reps, weight, volume in zip(
+                    dates, columns.workouts, columns.exercises,
+                    columns.sets.tolist(), columns.reps.tolist(), columns.weights.tolist(), columns.volumes.tolist()
+                )
+            ]
+        }
+
+    def buckets(self, query):
+        try:
+            buckets = self.data_handler.get_history_buckets(
+                query.get('period', 'week'),
+                query.get('workout'),
+                query.get('exercise'),
+                start=_day(query['start']) if 'start' in query else None,
+                end=_day(query['end']) if 'end' in query else None
+            )
+        except ValueError as error:
+            raise ApiError(400, str(error))
+        return {'buckets': [dict(bucket._asdict(), start=bucket.start.isoformat()) for bucket in buckets]}
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the server's WorkoutApi"""
+    # Keep-alive, so clients don't pay a connection per request
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes, with Nagle each response waits on a delayed ACK
+    disable_nagle_algorithm = True
+    server_version = 'GymTrackerAPI/1.0'
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        # Always read the body, a keep-alive connection must not be left with it
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length else b''
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        api = self.server.api
+        try:
+            if method == 'GET' and parts == ['exercises']:
+                payload = api.exercises(query)
+            elif method == 'GET' and len(parts) == 2 and parts[0] == 'days':
+                payload = api.day(parts[1], query)
+            elif method == 'POST' and len(parts) == 2 and parts[0] == 'days':
+                payload = api.save_day(parts[1], self._parse_json(body))
+            elif method == 'GET' and len(parts) == 3 and parts[0] == 'days' and parts[2] == 'sets':
+                payload = api.sets(parts[1], query)
+            elif method == 'GET' and parts == ['history']:
+                payload = api.history(query)
+            elif method == 'GET' and parts == ['history', 'buckets']:
+                payload = api.buckets(query)
+            else:
+                raise ApiError(404, f"No route for {method} {url.path}")
+        except ApiError as error:
+            self._send(error.status, {'error': str(error)})
+            return
+        except Exception as error:
+            self.log_error("%s %s failed: %r", method, self.path, error)
+            self._send(500, {'error': f"{type(error).__name__}: {error}"})
+            return
+        self._send(200, payload)
+
+    def _parse_json(self, body):
+        try:
+            return json.loads(body or b'{}')
+        except ValueError:
+            raise ApiError(400, "The body is not valid JSON")
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def make_server(data_handler, host='127.0.0.1', port=8765, verbose=False):
+    """Create the API server on a DataHandler, port 0 picks a free port"""
+    server = ThreadingHTTPServer((host, port), ApiRequestHandler)
+    server.daemon_threads = True
+    server.api = WorkoutApi(data_handler)
+    server.verbose = verbose
+    return server
+
+def serve_in_background(data_handler, host='127.0.0.1', port=8765, verbose=False):
+    """Start the API server on a daemon thread, returns the server"""
+    server = make_server(data_handler, host, port, verbose)
+    threading.Thread(target=server.serve_forever, name="workout-api", daemon=True).start()
+    return server
+
+class ApiClient:
+    """Minimal client of the API over one keep-alive connection, one thread at a time"""
+    def __init__(self, host='127.0.0.1', port=8765, timeout=30):
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def request(self, method, path, params=None, body=None):
+        """Send a request, returns (status, decoded JSON)"""
+        params = {name: value for name, value in (params or {}).items() if value is not None}
+        if params:
+            path += '?' + urlencode(params)
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        self.connection.request(method, path, body=payload, headers=headers)
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def _ok(self, method, path, params=None, body=None):
+        status, payload = self.request(method, path, params, body)
+        if status != 200:
+            raise ApiError(status, payload.get('error'))
+        return payload
+
+    def exercises(self):
+        return self._ok('GET', '/exercises')['workouts']
+
+    def day(self, date, workout=None, exercise=None):
+        return self._ok('GET', f'/days/{quote(str(date), safe="")}', {'workout': workout, 'exercise': exercise})
+
+    def sets(self, date, workout, exercise):
+        return self._ok('GET', f'/days/{quote(str(date), safe="")}/sets', {'workout': workout, 'exercise': exercise})['sets']
+
+    def save_day(self, date, entries=(), deletes=(), maxes=()):
+        body = {'entries': list(entries), 'deletes': list(deletes), 'maxes': list(maxes)}
+        return self._ok('POST', f'/days/{quote(str(date), safe="")}', body=body)
+
+    def history(self, workout=None, exercise=None, start=None, end=None, limit=None, offset=None, order=None):
+        params = {'workout': workout, 'exercise': exercise, 'start': start, 'end': end, 'limit': limit, 'offset': offset, 'order': order}
+        return self._ok('GET', '/history', params)['rows']
+
+    def buckets(self, period='week', workout=None, exercise=None, start=None, end=None):
+        params = {'period': period, 'workout': workout, 'exercise': exercise, 'start': start, 'end': end}
+        return self._ok('GET', '/history/buckets', params)['buckets']
+
+    def close(self):
+        self.connection.close()
+
+def main(argv=None):
+    from data_handler import DataHandler
+
+    parser = argparse.ArgumentParser(description="Serve the workout tracker as a local HTTP/JSON API")
+    parser.add_argument('--db', default='data/data.db', help="the tracker database")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--write-behind', action='store_true', help="answer writes once queued instead of committed")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args(argv)
+
+    data_handler = DataHandler(args.db, write_behind=args.write_behind)
+    server = make_server(data_handler, args.host, args.port, args.verbose)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        data_handler.close()
+
+if __name__ == '__main__':
+    main()
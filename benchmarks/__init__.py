@@ -0,0 +1,8 @@
+"""Benchmarks for DataHandler and the Streamlit render functions
+
+Run from the repository root, results are written as JSON so runs of different
+commits can be compared:
+
+    python -m benchmarks.run --years 3 --exercises 200 --out before.json
+    python -m benchmarks.compare before.json after.json
+"""
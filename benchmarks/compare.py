@@ -0,0 +1,27 @@
+import argparse
+import json
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--stat', default='median_ms', choices=['min_ms', 'median_ms', 'mean_ms'])
+    args = parser.parse_args(argv)
+
+    before, after = load(args.before)['results'], load(args.after)['results']
+    width = max(len(name) for name in list(before) + list(after))
+    print(f"{'benchmark':<{width}}  {'before':>10}  {'after':>10}  {'speedup':>8}")
+    for name in list(dict.fromkeys(list(before) + list(after))):
+        old = before.get(name, {}).get(args.stat)
+        new = after.get(name, {}).get(args.stat)
+        speedup = f"{old / new:7.2f}x" if old and new else "       -"
+        old = f"{old:10.3f}" if old is not None else f"{'-':>10}"
+        new = f"{new:10.3f}" if new is not None else f"{'-':>10}"
+        print(f"{name:<{width}}  {old}  {new}  {speedup}")
+
+if __name__ == '__main__':
+    main()
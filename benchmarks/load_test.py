@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+
+from api import ApiClient, ApiError, serve_in_background
+from data_handler import DataHandler
+
+def simulate_client(port, exercises, seed, deadline, latencies, errors):
+    """Log and read through the API like a client app, until deadline"""
+    rng = random.Random(seed)
+    client = ApiClient(port=port)
+    today = date.today()
+    while time.perf_counter() < deadline:
+        workout, exercise = rng.choice(exercises)
+        day = (today - timedelta(days=rng.randint(0, 60))).isoformat()
+        action = rng.random()
+        start = time.perf_counter()
+        try:
+            if action < 0.3:
+                name = 'post_day'
+                entries = [
+                    {'workout': workout, 'exercise': exercise, 'sets': rng.randint(1, 5), 'reps': rng.randint(1, 15), 'weight': rng.randint(20, 200) / 2}
+                    for workout, exercise in rng.sample(exercises, 5)
+                ]
+                # Some entries are logged set by set
+                for entry in entries[:2]:
+                    entry['sets'] = [{'reps': rng.randint(1, 15), 'weight': rng.randint(20, 200) / 2, 'rpe': rng.choice([None, 8])} for _ in range(entry['sets'])]
+                client.save_day(day, entries)
+            elif action < 0.7:
+                name = 'get_day'
+                client.day(day, workout)
+            elif action < 0.9:
+                name = 'get_history'
+                client.history(workout, exercise, start=(today - timedelta(days=90)).isoformat())
+            else:
+                name = 'get_buckets'
+                client.buckets(rng.choice(['week', 'month']), workout, exercise)
+        except (ApiError, OSError) as error:
+            errors[f"{type(error).__name__}: {error}"] += 1
+            # Start over on a new connection, the old one may be half read
+            client.close()
+            client = ApiClient(port=port)
+            continue
+        latencies[name].append(time.perf_counter() - start)
+    client.close()
+
+def run_load(path, clients, seconds, seed=0, write_behind=False):
+    """Run clients threads against an in-process API server, returns throughput and latencies"""
+    data_handler = DataHandler(path, write_behind=write_behind)
+    server = serve_in_background(data_handler, port=0)
+    port = server.server_address[1]
+    exercises = data_handler.catalog.exercises
+
+    # Latencies and a Counter per thread, merged afterwards
+    results = [(defaultdict(list), Counter()) for _ in range(clients)]
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=simulate_client, args=(port, exercises, seed + i, deadline) + results[i])
+        for i in range(clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    server.server_close()
+    data_handler.close()
+
+    latencies = defaultdict(list)
+    for thread_latencies, _ in results:
+        for name, values in thread_latencies.items():
+            latencies[name].extend(values)
+    errors = sum((thread_errors for _, thread_errors in results), Counter())
+
+    def summary(values):
+        milliseconds = np.array(values) * 1000
+        p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+        return {'requests': len(values), 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'max_ms': milliseconds.max()}
+
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        'clients': clients,
+        'seconds': elapsed,
+        'requests': len(everything),
+        'requests_per_second': len(everything) / elapsed,
+        'latency': summary(everything) if everything else None,
+        'by_request': {name: summary(values) for name, values in sorted(latencies.items())},
+        'errors': dict(errors)
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load the HTTP/JSON API with many clients logging and reading at once")
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--write-behind', action='store_true')
+    parser.add_argument('--max-p99-ms', type=float, help="fail if the overall p99 latency is above this")
+    parser.add_argument('--db', help="database to use instead of a new temporary one")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        report = run_load(args.db or os.path.join(workdir, 'data.db'), args.clients, args.seconds, args.seed, args.write_behind)
+    print(json.dumps(report, indent=2))
+
+    if report['errors']:
+        raise SystemExit(f"{sum(report['errors'].values())} errors")
+    if args.max_p99_ms is not None and report['latency']['p99_ms'] > args.max_p99_ms:
+        raise SystemExit(f"p99 latency {report['latency']['p99_ms']:.1f} ms is above {args.max_p99_ms} ms")
+
+if __name__ == '__main__':
+    main()
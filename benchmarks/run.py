@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import streamlit_stub
+
+# The render functions import streamlit, so the stub goes in first
+st = streamlit_stub.install()
+
+import pandas as pd
+
+import components
+from data_handler import DataHandler, HistoryColumns, WorkoutEntry
+from tracing import QueryTracer
+from benchmarks.synthetic import generate_database
+
+def measure(func, repeat):
+    """Time repeated calls of func, in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        'repeat': repeat,
+        'min_ms': min(times),
+        'median_ms': statistics.median(times),
+        'mean_ms': statistics.fmean(times)
+    }
+
+def remove_database(path):
+    """Delete a database and its WAL files"""
+    for suffix in ['', '-wal', '-shm']:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def git_commit():
+    """Get the current commit, None outside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def bench_seeding(workdir, repeat):
+    """Time creating a new database and reopening an existing one"""
+    path = os.path.join(workdir, 'seed.db')
+
+    def seed_new():
+        remove_database(path)
+        DataHandler(path).close()
+
+    results = {'seed_new_database': measure(seed_new, repeat)}
+    results['open_existing_database'] = measure(lambda: DataHandler(path).close(), repeat)
+    remove_database(path)
+    return results
+
+def bench_data_handler(data_handler, day, repeat):
+    """Time every DataHandler read and write on a populated database"""
+    workout, exercise = data_handler.get_history_exercises()[0]
+    day_entries = [(day, w, e, 3, 10, 20.0) for w, e in data_handler.catalog.exercises[:10]]
+    calls = {
+        'get_workouts': lambda: data_handler.get_workouts(),
+        'get_exercises': lambda: data_handler.get_exercises(),
+        'get_exercises_by_workout': lambda: data_handler.get_exercises_by_workout(workout),
+        'get_last_workout': lambda: data_handler.get_last_workout(day, workout, exercise),
+        'get_current_workout': lambda: data_handler.get_current_workout(day, workout, exercise),
+        'get_max': lambda: data_handler.get_max(workout, exercise),
+        'get_exercise_stats': lambda: data_handler.get_exercise_stats(workout, exercise),
+        'get_day_snapshot': lambda: data_handler.get_day_snapshot(day),
+        'get_history_exercises': lambda: data_handler.get_history_exercises(),
+        'get_history_one_exercise': lambda: data_handler.get_history(workout, exercise, ascending=True),
+        'get_history_page': lambda: data_handler.get_history(limit=50),
+        'get_workout_history': lambda: data_handler.get_workout_history(),
+        'get_history_between_month': lambda: data_handler.get_history_between(day - timedelta(days=30), day),
+        'get_history_last_weeks_4': lambda: data_handler.get_history_last_weeks(4, today=day),
+        'get_history_buckets_week': lambda: data_handler.get_history_buckets('week'),
+        'get_history_buckets_month': lambda: data_handler.get_history_buckets('month'),
+        'get_history_buckets_week_one_exercise': lambda: data_handler.get_history_buckets('week', workout, exercise),
+        'save_workout': lambda: data_handler.save_workout(day, workout, exercise, 3, 10, 20.0),
+        'delete_workout': lambda: data_handler.delete_workout(day, workout, exercise),
+        'save_max': lambda: data_handler.save_max(workout, exercise, 100),
+        'save_many_10': lambda: data_handler.save_many(day_entries)
+    }
+    return {name: measure(call, repeat) for name, call in calls.items()}
+
+def bench_tracing(path, day, repeat):
+    """Time the snapshot query with no tracer, a tracer attached but idle, then tracing every call"""
+    # Cache hits run no query, so there would be nothing to trace
+    data_handler = DataHandler(path, cache_size=0)
+    results = {'get_day_snapshot_untraced': measure(lambda: data_handler.get_day_snapshot(day), repeat)}
+    data_handler.tracer = QueryTracer()
+    results['get_day_snapshot_tracer_idle'] = measure(lambda: data_handler.get_day_snapshot(day), repeat)
+    data_handler.tracer.start_rerun('benchmark')
+    results['get_day_snapshot_traced'] = measure(lambda: data_handler.get_day_snapshot(day), repeat)
+    data_handler.tracer.end_rerun()
+    data_handler.close()
+    return results
+
+def bench_records(data_handler, day, repeat):
+    """Time entry records against one-row frames, and history frames built from columns against rows"""
+    workout, exercise = data_handler.get_history_exercises()[0]
+    entry = data_handler.get_last_workout(day, workout, exercise)
+    columns = ['Date', 'Workout', 'Exercise', 'Sets', 'Reps', 'Weight']
+
+    def entry_frame():
+        # What single entry lookups returned before, unwrapped like the form did
+        frame = pd.DataFrame([(entry.date, workout, exercise, entry.sets, entry.reps, entry.weight)], columns=columns)
+        return int(frame['Sets'].iloc[0]), int(frame['Reps'].iloc[0]), float(frame['Weight'].iloc[0])
+
+    def entry_record():
+        record = WorkoutEntry(entry.date, entry.sets, entry.reps, entry.weight)
+        return int(record.sets), int(record.reps), float(record.weight)
+
+    catalog = data_handler.catalog
+    rows = data_handler._fetchall("SELECT date, workout_id, exercise_id, sets, reps, weight, COALESCE(volume, sets * reps * weight) FROM History ORDER BY date", ())
+
+    def history_from_rows():
+        history = pd.DataFrame(rows, columns=columns + ['Volume'])
+        history['Workout'] = history['Workout'].map(catalog.workout_names)
+        history['Exercise'] = history['Exercise'].map(catalog.exercise_names)
+        return history
+
+    return {
+        'entry_frame': measure(entry_frame, repeat),
+        'entry_record': measure(entry_record, repeat),
+        'history_frame_from_rows': measure(history_from_rows, max(repeat // 5, 1)),
+        'history_columns': measure(lambda: HistoryColumns(rows, catalog), max(repeat // 5, 1)),
+        'history_frame_from_columns': measure(lambda: HistoryColumns(rows, catalog).to_frame(), max(repeat // 5, 1))
+    }
+
+def bench_query_cache(path, day, repeat):
+    """Time repeated reads with and without the query cache, and a read right after a write"""
+    results = {}
+    for label, cache_size in [('uncached', 0), ('cached', 256)]:
+        data_handler = DataHandler(path, cache_size=cache_size)
+        workout, exercise = data_handler.get_history_exercises()[0]
+        results[f'get_day_snapshot_{label}'] = measure(lambda: data_handler.get_day_snapshot(day), repeat)
+        results[f'get_history_one_exercise_{label}'] = measure(lambda: data_handler.get_history(workout, exercise, ascending=True), repeat)
+        results[f'get_workout_history_{label}'] = measure(lambda: data_handler.get_workout_history(), max(repeat // 5, 1))
+
+        # A save only expires the reads of its own exercise and the whole-table ones
+        other = data_handler.catalog.exercises[-1]
+
+        def save_and_read():
+            data_handler.save_workout(day, workout, exercise, 3, 10, 20.0)
+            data_handler.get_last_workout(day, *other)
+            data_handler.get_last_workout(day, workout, exercise)
+
+        results[f'save_then_read_{label}'] = measure(save_and_read, repeat)
+        if cache_size:
+            results['query_cache_stats'] = data_handler.cache_stats()
+        data_handler.close()
+    return results
+
+def bench_write_behind(path, day, repeat):
+    """Time writes that return once queued, and the flush that commits them"""
+    data_handler = DataHandler(path, write_behind=True)
+    workout, exercise = data_handler.catalog.exercises[0]
+    results = {
+        'save_workout_write_behind': measure(lambda: data_handler.save_workout(day, workout, exercise, 3, 10, 20.0), repeat),
+        'save_max_write_behind': measure(lambda: data_handler.save_max(workout, exercise, 100), repeat)
+    }
+
+    def save_and_flush():
+        data_handler.save_workout(day, workout, exercise, 3, 10, 20.0)
+        data_handler.flush()
+
+    results['save_workout_write_behind_flushed'] = measure(save_and_flush, repeat)
+    data_handler.close()
+    return results
+
+def bench_import_export(data_handler, workdir, repeat):
+    """Time exporting all history and importing it into a new database"""
+    results = {}
+    for extension in ['csv', 'parquet']:
+        export_path = os.path.join(workdir, f'history.{extension}')
+        results[f'export_history_{extension}'] = measure(lambda: data_handler.export_history(export_path), repeat)
+
+        import_path = os.path.join(workdir, 'import.db')
+
+        def import_new():
+            remove_database(import_path)
+            imported = DataHandler(import_path)
+            imported.import_history(export_path)
+            imported.close()
+
+        results[f'import_history_{extension}'] = measure(import_new, repeat)
+        remove_database(import_path)
+    return results
+
+def bench_render(data_handler, day, repeat):
+    """Time the render functions through the streamlit stub"""
+    results = {}
+
+    def render_form(expanded, opened):
+        st.reset()
+        st.answers['workout_date'] = day
+        for workout in data_handler.catalog.workouts:
+            st.session_state[f"expanded_{workout}"] = expanded
+        if opened:
+            for workout, exercise in data_handler.catalog.exercises:
+                st.session_state[f"isOpened_{workout}_{exercise}"] = True
+        components.render_workout_form(data_handler)
+
+    results['render_workout_form_collapsed'] = measure(lambda: render_form(False, False), repeat)
+    results['render_workout_form'] = measure(lambda: render_form(True, False), repeat)
+    results['render_workout_form_all_opened'] = measure(lambda: render_form(True, True), repeat)
+
+    def render_exercise(opened):
+        # A button press inside one exercise only reruns its fragment
+        workout, exercise = data_handler.catalog.exercises[0]
+        st.session_state[f"isOpened_{workout}_{exercise}"] = opened
+        entry = data_handler.get_day_snapshot(day, workout, exercise)[(workout, exercise)]
+        components.render_exercise_form(data_handler, day, workout, exercise, entry)
+
+    results['render_exercise_fragment'] = measure(lambda: render_exercise(True), repeat)
+
+    def render_history(view):
+        st.reset()
+        st.answers['View'] = view
+        components.render_history_view(data_handler)
+
+    results['render_history_view'] = measure(lambda: render_history('Single exercise'), repeat)
+    results['render_history_dashboard'] = measure(lambda: render_history('All exercises'), max(repeat // 5, 1))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DataHandler and the render functions")
+    parser.add_argument('--years', type=float, default=3, help="years of daily sessions")
+    parser.add_argument('--workouts', type=int, default=4, help="extra generated workouts")
+    parser.add_argument('--exercises', type=int, default=100, help="total exercises in the catalog")
+    parser.add_argument('--per-session', type=int, default=6, help="exercises logged per session")
+    parser.add_argument('--repeat', type=int, default=20, help="timed calls per benchmark")
+    parser.add_argument('--seed', type=int, default=0, help="random seed of the generator")
+    parser.add_argument('--db', help="keep the generated database at this path")
+    parser.add_argument('--out', help="write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = args.db or os.path.join(workdir, 'data.db')
+        remove_database(path)
+
+        start = time.perf_counter()
+        data_handler, rows = generate_database(
+            path,
+            years=args.years,
+            workouts=args.workouts,
+            exercises=args.exercises,
+            exercises_per_session=args.per_session,
+            seed=args.seed
+        )
+        generate_seconds = time.perf_counter() - start
+
+        # A day in the middle of the history has both earlier and current entries
+        day = datetime.now().date() - timedelta(days=int(args.years * 365 / 2))
+
+        results = {}
+        results.update(bench_seeding(workdir, args.repeat))
+        results.update(bench_data_handler(data_handler, day, args.repeat))
+        results.update(bench_tracing(path, day, args.repeat))
+        results.update(bench_records(data_handler, day, args.repeat))
+        results.update(bench_query_cache(path, day, args.repeat))
+        results.update(bench_write_behind(path, day, args.repeat))
+        results.update(bench_import_export(data_handler, workdir, max(args.repeat // 10, 1)))
+        results.update(bench_render(data_handler, day, args.repeat))
+        data_handler.close()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'parameters': vars(args),
+            'history_rows': rows,
+            'generate_seconds': generate_seconds
+        },
+        'results': results
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import sys
+import types
+
+class SessionState(dict):
+    """Dict with attribute access, like st.session_state"""
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+class _Container:
+    """Stands in for columns, expanders, forms and the sidebar"""
+    def __init__(self, module):
+        self._module = module
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+class StreamlitStub(types.ModuleType):
+    """Headless streamlit replacement that renders nothing
+
+    Widgets return their value from answers (keyed on widget key or label),
+    else their default. Buttons in clicks return True once.
+    """
+    def __init__(self):
+        super().__init__('streamlit')
+        self.session_state = SessionState()
+        self.answers = {}
+        self.clicks = set()
+        self.sidebar = _Container(self)
+        self.column_config = types.SimpleNamespace(NumberColumn=lambda *args, **kwargs: None)
+        self.calls = 0
+
+    def reset(self):
+        """Forget all session state, like a new browser session"""
+        self.session_state.clear()
+        self.answers.clear()
+        self.clicks.clear()
+
+    def _answer(self, label, key, default):
+        self.calls += 1
+        value = self.answers.get(key, self.answers.get(label, default))
+        if key is not None:
+            self.session_state.setdefault(key, value)
+            return self.session_state[key]
+        return value
+
+    # Decorators
+    def cache_resource(self, func=None, **kwargs):
+        return func if func is not None else (lambda f: f)
+
+    cache_data = cache_resource
+    fragment = cache_resource
+
+    # Layout
+    def columns(self, spec, **kwargs):
+        count = spec if isinstance(spec, int) else len(spec)
+        return [_Container(self) for _ in range(count)]
+
+    def expander(self, label, expanded=False, key=None, on_change='ignore', **kwargs):
+        container = _Container(self)
+        # Only expanders that track their state know whether they are open
+        container.open = self._answer(label, key, expanded) if on_change != 'ignore' else None
+        return container
+
+    def form(self, *args, **kwargs):
+        return _Container(self)
+
+    def container(self, *args, **kwargs):
+        return _Container(self)
+
+    # Widgets
+    def form_submit_button(self, label, **kwargs):
+        self.calls += 1
+        if label in self.clicks:
+            self.clicks.discard(label)
+            return True
+        return False
+
+    button = form_submit_button
+
+    def date_input(self, label, value=None, key=None, **kwargs):
+        return self._answer(label, key, value)
+
+    def number_input(self, label, value=None, key=None, **kwargs):
+        return self._answer(label, key, value)
+
+    def selectbox(self, label, options, index=0, key=None, **kwargs):
+        options = list(options)
+        return self._answer(label, key, options[index] if options else None)
+
+    def radio(self, label, options, index=0, key=None, **kwargs):
+        options = list(options)
+        return self._answer(label, key, options[index] if options else None)
+
+    def checkbox(self, label, value=False, key=None, **kwargs):
+        return self._answer(label, key, value)
+
+    toggle = checkbox
+
+    def data_editor(self, data, key=None, **kwargs):
+        return self._answer(None, key, data)
+
+    # Output, these render nothing
+    def _noop(self, *args, **kwargs):
+        self.calls += 1
+
+    set_page_config = title = markdown = text = write = subheader = warning = error = _noop
+    metric = dataframe = plotly_chart = json = caption = info = download_button = rerun = _noop
+
+def install():
+    """Put the stub in sys.modules, call before importing components or main"""
+    stub = StreamlitStub()
+    sys.modules['streamlit'] = stub
+    return stub
@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from data_handler import DataHandler, VOLUME_SQL
+
+def simulate_session(data_handler, seed, deadline, counts, errors):
+    """Save and read like a user clicking through the daily form, until deadline"""
+    rng = random.Random(seed)
+    exercises = data_handler.catalog.exercises
+    today = date.today()
+    while time.perf_counter() < deadline:
+        workout, exercise = rng.choice(exercises)
+        day = today - timedelta(days=rng.randint(0, 60))
+        action = rng.random()
+        try:
+            if action < 0.1:
+                data_handler.save_sets(day, workout, exercise, [(rng.randint(1, 15), rng.randint(20, 200) / 2, rng.choice([None, 7, 8.5, 10])) for _ in range(rng.randint(1, 6))])
+                counts['save_sets'] += 1
+            elif action < 0.3:
+                data_handler.save_workout(day, workout, exercise, rng.randint(1, 5), rng.randint(1, 15), rng.randint(20, 200) / 2)
+                counts['save_workout'] += 1
+            elif action < 0.4:
+                data_handler.delete_workout(day, workout, exercise)
+                counts['delete_workout'] += 1
+            elif action < 0.45:
+                data_handler.save_max(workout, exercise, rng.randint(20, 200))
+                counts['save_max'] += 1
+            elif action < 0.5:
+                with data_handler.batch() as batch:
+                    for workout, exercise in rng.sample(exercises, 5):
+                        batch.save_workout(day, workout, exercise, 3, 10, 50.0)
+                counts['batch'] += 1
+            elif action < 0.85:
+                data_handler.get_day_snapshot(day)
+                counts['get_day_snapshot'] += 1
+            else:
+                data_handler.get_history(workout, exercise, ascending=True)
+                counts['get_history'] += 1
+        except Exception as error:
+            errors[f"{type(error).__name__}: {error}"] += 1
+
+def run_stress(path, sessions, seconds, seed=0):
+    """Run sessions threads against one shared DataHandler, returns counts and errors"""
+    data_handler = DataHandler(path)
+    # A Counter per thread, merged afterwards
+    results = [(Counter(), Counter()) for _ in range(sessions)]
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=simulate_session, args=(data_handler, seed + i, deadline) + results[i])
+        for i in range(sessions)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    counts = sum((thread_counts for thread_counts, _ in results), Counter())
+    errors = sum((thread_errors for _, thread_errors in results), Counter())
+
+    # The stats triggers must still agree with History after all the contention,
+    # and only rows logged per set may have sets
+    consistent = data_handler._fetchall("""
+    SELECT COUNT(*) = (SELECT COALESCE(SUM(sessions), 0) FROM ExerciseStats)
+        AND ABS(COALESCE(SUM(""" + VOLUME_SQL.format(row="History") + """), 0) - (SELECT COALESCE(SUM(volume), 0) FROM ExerciseStats)) < 0.01
+        AND NOT EXISTS (
+            SELECT 1 FROM HistorySets
+            LEFT JOIN History ON History.id = HistorySets.history_id
+            WHERE History.volume IS NULL
+        )
+    FROM History
+    """)[0][0] == 1
+
+    # Whatever the query cache still holds must match a handler without one
+    uncached = DataHandler(path, cache_size=0)
+    today = date.today()
+    cache_consistent = all(
+        data_handler.get_day_snapshot(today - timedelta(days=days)) == uncached.get_day_snapshot(today - timedelta(days=days))
+        for days in range(61)
+    )
+    uncached.close()
+    cache_stats = data_handler.cache_stats()
+    data_handler.close()
+    return {
+        'sessions': sessions,
+        'seconds': elapsed,
+        'operations': sum(counts.values()),
+        'operations_per_second': sum(counts.values()) / elapsed,
+        'counts': dict(counts),
+        'errors': dict(errors),
+        'stats_consistent': consistent,
+        'cache_consistent': cache_consistent,
+        'cache': cache_stats
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run many simulated sessions saving and reading at once")
+    parser.add_argument('--sessions', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db', help="database to use instead of a new temporary one")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        report = run_stress(args.db or os.path.join(workdir, 'data.db'), args.sessions, args.seconds, args.seed)
+    print(json.dumps(report, indent=2))
+
+    locked = sum(count for error, count in report['errors'].items() if 'database is locked' in error)
+    if report['errors'] or not report['stats_consistent'] or not report['cache_consistent']:
+        raise SystemExit(f"{sum(report['errors'].values())} errors ({locked} 'database is locked')")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import random
+from datetime import date, timedelta
+
+from data_handler import DataHandler
+
+def generate_database(path, years=3, workouts=4, exercises=100, exercises_per_session=6, seed=0, chunk_size=5000):
+    """Create a database at path with years of daily sessions over a generated catalog
+
+    Every day trains the next workout in rotation and logs a random selection
+    of its exercises, with weights that slowly progress. The tracker has no
+    notion of users, so one database is one user.
+    """
+    rng = random.Random(seed)
+    data_handler = DataHandler(path)
+
+    # Extend the seeded catalog up to the requested size
+    existing = len(data_handler.catalog.exercises)
+    catalog = [(f"Workout {i % workouts + 1}", f"Exercise {i + 1}") for i in range(max(exercises - existing, 0))]
+    data_handler.add_exercises(catalog)
+
+    by_workout = data_handler.catalog.exercises_by_workout
+    rotation = [workout for workout in by_workout if by_workout[workout]]
+    base_weights = {key: rng.uniform(10, 80) for key in data_handler.catalog.exercises}
+
+    start = date.today() - timedelta(days=int(years * 365))
+    entries = []
+    rows = 0
+    for day in range(int(years * 365)):
+        workout = rotation[day % len(rotation)]
+        session = rng.sample(by_workout[workout], min(exercises_per_session, len(by_workout[workout])))
+        for exercise in session:
+            weight = base_weights[(workout, exercise)] * (1 + day / 1000) + rng.uniform(-2.5, 2.5)
+            entries.append((
+                start + timedelta(days=day),
+                workout,
+                exercise,
+                rng.randint(2, 5),
+                rng.randint(3, 15),
+                round(max(weight, 0) * 2) / 2
+            ))
+        if len(entries) >= chunk_size:
+            rows += data_handler.save_many(entries)
+            entries = []
+    rows += data_handler.save_many(entries)
+    return data_handler, rows
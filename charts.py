@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+# Most points a progress line is drawn with
+MAX_POINTS = 400
+
+# Bucket size by the number of days the series spans, as (longest span, pandas
+# period, label). Longer series fall through to the last one.
+BUCKETS = [
+    (365, None, 'daily'),
+    (4 * 365, 'W-SUN', 'weekly best'),
+    (None, 'M', 'monthly best')
+]
+
+def lttb(x, y, threshold):
+    """Pick threshold indices that keep the shape of a line (largest triangle three buckets)"""
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, size - 1
+
+    # The first and last point are kept, the rest is split in threshold - 2 buckets
+    edges = np.linspace(1, size - 1, threshold - 1).astype(int)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Average of the next bucket, the last point for the final bucket
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else size
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+def downsample_progress(exercise_data, max_points=MAX_POINTS):
+    """Reduce a Date/Weight series to at most max_points, by bucket and then LTTB
+
+    Returns the reduced frame and a label of how it was reduced.
+    """
+    data = exercise_data[['Date', 'Weight']].copy()
+    data['Date'] = pd.to_datetime(data['Date'])
+    if data.empty:
+        return data, 'daily'
+
+    span = (data['Date'].iloc[-1] - data['Date'].iloc[0]).days
+    for longest, period, label in BUCKETS:
+        if longest is None or span <= longest:
+            break
+
+    if period is not None:
+        buckets = data['Date'].dt.to_period(period).dt.start_time
+        data = data.groupby(buckets)['Weight'].max().rename_axis('Date').reset_index()
+
+    if len(data) > max_points:
+        keep = lttb(data['Date'].astype('int64').to_numpy(), data['Weight'].to_numpy(), max_points)
+        data = data.iloc[keep].reset_index(drop=True)
+    return data, label
+
+def build_progress_figure(exercise, exercise_data, max_points=MAX_POINTS):
+    """Build the weight progress chart of an exercise from its downsampled history"""
+    data, label = downsample_progress(exercise_data, max_points)
+    title = f'{exercise} Progress Over Time'
+    if label != 'daily':
+        title += f' ({label})'
+
+    fig = px.line(
+        data,
+        x='Date',
+        y='Weight',
+        title=title,
+        markers=len(data) <= 60
+    )
+    # European dates, plotly picks the tick spacing for the range
+    fig.update_xaxes(
+        tickformat="%d/%m/%Y",
+        nticks=12
+    )
+    return fig
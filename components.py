@@ -1,15 +1,28 @@
 import streamlit as st
 import plotly.express as px
 import pandas as pd
-from datetime import datetime
-from utils import calculate_progress, format_date
+from datetime import datetime, timedelta
+from utils import progress_from_stats, format_date
+from analytics import compute_dashboard
+from charts import build_progress_figure
+from data_handler import WorkoutEntry
+from workout_sets import WorkoutSet, rollup_sets, MAX_REPS, MAX_WEIGHT
+
+# History view periods and how many days back they reach
+HISTORY_PERIODS = {
+    "All time": None,
+    "Last year": 365,
+    "Last 3 months": 91,
+    "Last month": 30
+}
 
 def update_workout_data(data_handler):
-    for workout in data_handler.get_workouts():
-        for exercise in data_handler.get_exercises_by_workout(workout):
+    # Collect every exercise's save/delete and write them in one transaction
+    with data_handler.batch() as batch:
+        for workout, exercise in data_handler.catalog.exercises:
             if f"save_{workout}_{exercise}" in st.session_state:
                 if st.session_state[f"save_{workout}_{exercise}"]:
-                    data_handler.save_workout(
+                    batch.save_workout(
                         st.session_state["workout_date"],
                         workout,
                         exercise,
@@ -18,11 +31,12 @@ def update_workout_data(data_handler):
                         st.session_state[f"weight_{workout}_{exercise}"]
                     )
                 else:
-                    data_handler.delete_workout(
+                    batch.delete_workout(
                         st.session_state["workout_date"],
                         workout,
                         exercise
                     )
+    return batch.changes
 
         
 
@@ -39,154 +53,326 @@ def render_workout_form(data_handler):
             help="Choose a date of your workout"
         )
 
-    for workout in data_handler.get_workouts():
-        with st.expander(f"**💪 {workout}**"):
-            for exercise in data_handler.get_exercises_by_workout(workout):
-                with st.form(f"{exercise}"):
-                    # Get last workout for this exercise
-                    last_workout = data_handler.get_last_workout(selected_date, workout, exercise)
-                    """
-                    header_col, open_col = st.columns([12, 1])
-                    with header_col:
-                        # Workout details
-                        if last_workout is not None:
-                            st.subheader(f"**{exercise}** - Last: {last_workout['Date'].iloc[0]}")
-                        else:
-                            st.subheader(f"**{exercise}**")
-                    
-                    with open_col:
-                        if st.form_submit_button("v", use_container_width=True):
-                            
-                    """
-                    if st.form_submit_button(f"**{exercise}**", use_container_width=True):
-                        if f"isOpened_{workout}_{exercise}" not in st.session_state:
-                            st.session_state[f"isOpened_{workout}_{exercise}"] = False
-                        st.session_state[f"isOpened_{workout}_{exercise}"] = not st.session_state[f"isOpened_{workout}_{exercise}"]
-                    
-                    if last_workout is not None:
-                        st.text("- Last: {last_workout['Date'].iloc[0]}")
-                    
-                    if f"isOpened_{workout}_{exercise}"in st.session_state and st.session_state[f"isOpened_{workout}_{exercise}"]:
-                        save_col, del_col = st.columns([1, 1])
-                        with save_col:
-                            if st.form_submit_button("Save exercise", use_container_width=True):
-                                data_handler.save_workout(
-                                    selected_date,
-                                    workout,
-                                    exercise,
-                                    st.session_state[f"sets_{workout}_{exercise}"],
-                                    st.session_state[f"reps_{workout}_{exercise}"],
-                                    st.session_state[f"weight_{workout}_{exercise}"]
-                                )
-                        
-
-                        show_current = False
-                        with del_col:
-                            current_workout = data_handler.get_current_workout(selected_date, workout, exercise)
-                            if current_workout is not None:
-                                if not st.form_submit_button("Remove exercise", use_container_width=True):
-                                    show_current = True     
-                                else:
-                                    data_handler.delete_workout(
-                                        selected_date,
-                                        workout,
-                                        exercise
-                                    )
-                        current_workout = data_handler.get_current_workout(selected_date, workout, exercise)
-
-                        if show_current:
-                            st.write(f"Current workout: {current_workout['Sets'].iloc[0]} sets, {current_workout['Reps'].iloc[0]} reps, {current_workout['Weight'].iloc[0]} kg")
-                        
-                        # Set default values from last workout if available
-                        default_sets = int(current_workout['Sets'].iloc[0]) if current_workout is not None else int(last_workout['Sets'].iloc[0]) if last_workout is not None else 3
-                        default_reps = int(current_workout['Reps'].iloc[0]) if current_workout is not None else int(last_workout['Reps'].iloc[0]) if last_workout is not None else 10
-                        default_weight = float(current_workout['Weight'].iloc[0]) if current_workout is not None else float(last_workout['Weight'].iloc[0]) if last_workout is not None else 20.0
-
-                        # Workout details
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            st.number_input("Sets", min_value=1, value=default_sets, key=f"sets_{workout}_{exercise}")
-                        with col2:
-                            st.number_input("Reps", min_value=1, value=default_reps, key=f"reps_{workout}_{exercise}")
-                        with col3:
-                            st.number_input("Weight (kg)", min_value=0.0, value=default_weight, step=0.5, key=f"weight_{workout}_{exercise}")
-
-                        
-
-                        maxInput_col, saveMax_col = st.columns([3, 1], vertical_alignment="bottom")
-
-
-                    
-                        with saveMax_col:
-                            if st.form_submit_button("Save max", use_container_width=True,):
-                                data_handler.save_max(
-                                    workout,
-                                    exercise,
-                                    st.session_state[f"max_{workout}_{exercise}"]
-                                )
-
-                        with maxInput_col:
-                            max_weight = float(data_handler.get_max(workout, exercise))
-                            st.number_input("Max Weight (kg)", min_value=0.0, value=max_weight, step=0.5, key=f"max_{workout}_{exercise}")
+    for workout, exercises in data_handler.catalog.exercises_by_workout.items():
+        # A tracked expander reruns when toggled, so collapsed workouts load nothing
+        expander = st.expander(f"**💪 {workout}**", key=f"expanded_{workout}", on_change="rerun")
+        with expander:
+            if not expander.open:
+                continue
+            # Last, current and max of the workout's exercises in one query
+            snapshot = data_handler.get_day_snapshot(selected_date, workout)
+            for exercise in exercises:
+                entry = snapshot.get((workout, exercise), {'Last': None, 'Current': None, 'Max': None, 'Best': None})
+                render_exercise_form(data_handler, selected_date, workout, exercise, entry)
+
+@st.fragment
+def render_exercise_form(data_handler, selected_date, workout, exercise, entry):
+    """Render the form of one exercise, its buttons only rerun this fragment"""
+    # Fragment reruns skip main.py and its trace, so with ?debug=1 they trace themselves
+    tracer = data_handler.tracer
+    if tracer is None or tracer.current() is not None or st.query_params.get("debug") != "1":
+        _render_exercise_form(data_handler, selected_date, workout, exercise, entry)
+        return
+
+    tracer.start_rerun(f"fragment {workout} / {exercise}")
+    try:
+        _render_exercise_form(data_handler, selected_date, workout, exercise, entry)
+    finally:
+        rerun = tracer.end_rerun()
+    # The sidebar panel is drawn by full reruns only, the trace is in its export
+    trace = rerun.to_dict()
+    st.caption(
+        f"🐢 Fragment rerun {trace['seconds'] * 1000:.1f} ms, "
+        f"{trace['query_count']} queries ({trace['query_seconds'] * 1000:.1f} ms)"
+    )
+
+def _render_exercise_form(data_handler, selected_date, workout, exercise, entry):
+    # Fragment reruns get the same entry dict back, the saves below keep it current
+    with st.form(f"{exercise}"):
+        # Get last workout for this exercise
+        last_workout = entry['Last']
+        """
+        header_col, open_col = st.columns([12, 1])
+        with header_col:
+            # Workout details
+            if last_workout is not None:
+                st.subheader(f"**{exercise}** - Last: {last_workout.date}")
+            else:
+                st.subheader(f"**{exercise}**")
+
+        with open_col:
+            if st.form_submit_button("v", use_container_width=True):
+
+        """
+        if st.form_submit_button(f"**{exercise}**", use_container_width=True):
+            if f"isOpened_{workout}_{exercise}" not in st.session_state:
+                st.session_state[f"isOpened_{workout}_{exercise}"] = False
+            st.session_state[f"isOpened_{workout}_{exercise}"] = not st.session_state[f"isOpened_{workout}_{exercise}"]
+
+        if last_workout is not None:
+            st.text(f"- Last: {last_workout.date}")
+
+        if f"isOpened_{workout}_{exercise}"in st.session_state and st.session_state[f"isOpened_{workout}_{exercise}"]:
+            save_col, del_col = st.columns([1, 1])
+            with save_col:
+                if st.form_submit_button("Save exercise", use_container_width=True):
+                    data_handler.save_workout(
+                        selected_date,
+                        workout,
+                        exercise,
+                        st.session_state[f"sets_{workout}_{exercise}"],
+                        st.session_state[f"reps_{workout}_{exercise}"],
+                        st.session_state[f"weight_{workout}_{exercise}"]
+                    )
+                    # Keep the snapshot in line with what was just saved
+                    entry['Current'] = WorkoutEntry(
+                        selected_date,
+                        st.session_state[f"sets_{workout}_{exercise}"],
+                        st.session_state[f"reps_{workout}_{exercise}"],
+                        st.session_state[f"weight_{workout}_{exercise}"]
+                    )
+
+
+            show_current = False
+            with del_col:
+                if entry['Current'] is not None:
+                    if not st.form_submit_button("Remove exercise", use_container_width=True):
+                        show_current = True     
+                    else:
+                        data_handler.delete_workout(
+                            selected_date,
+                            workout,
+                            exercise
+                        )
+                        entry['Current'] = None
+            current_workout = entry['Current']
+
+            # Sets of the current entry, or of the last one to start from
+            source = current_workout if current_workout is not None else last_workout
+            logged_sets = data_handler.get_sets(source.date, workout, exercise) if source is not None else []
+
+            if show_current:
+                st.write(f"Current workout: {current_workout.sets} sets, {current_workout.reps} reps, {current_workout.weight} kg")
+                # Only worth listing when the sets differ
+                if len(set(logged_sets)) > 1:
+                    st.caption(" · ".join(
+                        f"{workout_set.reps} x {workout_set.weight} kg" + (f" @{workout_set.rpe}" if workout_set.rpe is not None else "")
+                        for workout_set in logged_sets
+                    ))
+
+            # Set default values from last workout if available
+            default_sets = int(current_workout.sets) if current_workout is not None else int(last_workout.sets) if last_workout is not None else 3
+            default_reps = int(current_workout.reps) if current_workout is not None else int(last_workout.reps) if last_workout is not None else 10
+            default_weight = float(current_workout.weight) if current_workout is not None else float(last_workout.weight) if last_workout is not None else 20.0
+
+            # Workout details
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.number_input("Sets", min_value=1, value=default_sets, key=f"sets_{workout}_{exercise}")
+            with col2:
+                st.number_input("Reps", min_value=1, value=default_reps, key=f"reps_{workout}_{exercise}")
+            with col3:
+                st.number_input("Weight (kg)", min_value=0.0, value=default_weight, step=0.5, key=f"weight_{workout}_{exercise}")
+
+            # Optional per set logging, for drop sets and RPE. Saving the sets
+            # replaces the sets, reps and weight above with their rollup.
+            version_key = f"setlog_version_{workout}_{exercise}"
+            edited_sets = st.data_editor(
+                pd.DataFrame(logged_sets, columns=['Reps', 'Weight', 'RPE']).astype({'Reps': 'Int64', 'Weight': float, 'RPE': float}),
+                num_rows="dynamic",
+                column_config={
+                    "Reps": st.column_config.NumberColumn("Reps", min_value=1, max_value=MAX_REPS, step=1, required=True),
+                    "Weight": st.column_config.NumberColumn("Weight (kg)", min_value=0.0, max_value=MAX_WEIGHT, step=0.5, required=True),
+                    "RPE": st.column_config.NumberColumn("RPE", min_value=1.0, max_value=10.0, step=0.5)
+                },
+                # A new key after every save, so the editor restarts from the saved sets
+                key=f"setlog_{workout}_{exercise}_{st.session_state.get(version_key, 0)}",
+                use_container_width=True
+            )
+            if st.form_submit_button("Save sets", use_container_width=True):
+                sets = [
+                    WorkoutSet(int(row.Reps), float(row.Weight), None if pd.isna(row.RPE) else float(row.RPE))
+                    for row in edited_sets.dropna(subset=['Reps', 'Weight']).itertuples()
+                ]
+                try:
+                    data_handler.save_sets(selected_date, workout, exercise, sets)
+                except ValueError as error:
+                    st.error(str(error))
+                else:
+                    entry['Current'] = WorkoutEntry(selected_date, *rollup_sets(sets)[:3]) if sets else None
+                    st.session_state[version_key] = st.session_state.get(version_key, 0) + 1
+                    # The form above was drawn before the save, this also runs outside fragment reruns
+                    st.rerun()
+
+
+
+            maxInput_col, saveMax_col = st.columns([3, 1], vertical_alignment="bottom")
+
+
+
+            with saveMax_col:
+                if st.form_submit_button("Save max", use_container_width=True,):
+                    data_handler.save_max(
+                        workout,
+                        exercise,
+                        st.session_state[f"max_{workout}_{exercise}"]
+                    )
+                    entry['Max'] = st.session_state[f"max_{workout}_{exercise}"]
+
+            with maxInput_col:
+                # The saved max goes stale, so never show less than the best logged weight
+                max_weight = float(max(entry['Max'] or 0, entry['Best'] or 0))
+                st.number_input("Max Weight (kg)", min_value=0.0, value=max_weight, step=0.5, key=f"max_{workout}_{exercise}")
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def progress_chart(workout, exercise, revision, start, _exercise_data):
+    """Build the downsampled progress chart, cached per exercise, revision and range"""
+    return build_progress_figure(exercise, _exercise_data)
 
 def render_history_view(data_handler):
     """Render the exercise history view"""
-    history_df = data_handler.get_workout_history()
+    # Only the exercise names feed the select boxes, the rows are loaded per series
+    history_exercises = data_handler.get_history_exercises()
 
-    if history_df is None:
+    if not history_exercises:
         st.warning("No workout history available")
         return
 
+    view = st.radio("View", ["Single exercise", "All exercises"], horizontal=True)
+    if view == "All exercises":
+        render_dashboard(data_handler)
+        return
+
     # Exercise selection for progress view
     workout = st.selectbox(
         "Select workout to view progress",
-        history_df['Workout'].unique()
+        list(dict.fromkeys(workout for workout, _ in history_exercises))
     )
 
     exercise = st.selectbox(
         "Select exercise to view progress",
-        history_df[history_df['Workout'] == workout]['Exercise'].unique()
+        [name for workout_name, name in history_exercises if workout_name == workout]
     )
 
-    # Get exercise progress data
-    exercise_data = history_df[(history_df['Workout'] == workout) & (history_df['Exercise'] == exercise)].sort_values('Date')
+    period = st.selectbox(
+        "Select period",
+        list(HISTORY_PERIODS)
+    )
+    start = None
+    if HISTORY_PERIODS[period] is not None:
+        start = datetime.now().date() - timedelta(days=HISTORY_PERIODS[period])
 
-    if not exercise_data.empty:
-        # Format the date column to remove time
-        exercise_data['Date'] = pd.to_datetime(exercise_data['Date']).dt.date
+    # Get exercise progress data
+    exercise_data = data_handler.get_history(workout, exercise, start=start, ascending=True)
 
-        # Progress metrics
-        last_weight, progress = calculate_progress(history_df, workout, exercise)
+    if exercise_data is not None:
+        # Progress metrics, precomputed over all time
+        stats = data_handler.get_exercise_stats(workout, exercise)
+        last_weight, progress = progress_from_stats(stats)
 
         # Display metrics
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         with col1:
             st.metric("Current Weight", f"{last_weight}kg")
         with col2:
             if progress is not None:
                 st.metric("Progress", f"{progress:.1f}%")
+        with col3:
+            if stats is not None:
+                st.metric("Best Weight", f"{stats['BestWeight']}kg", help=f"Estimated 1RM: {stats['BestE1RM']:.1f}kg")
 
-        # Progress chart
-        fig = px.line(
-            exercise_data,
-            x='Date',
-            y='Weight',
-            title=f'{exercise} Progress Over Time'
-        )
-        # Update x-axis to show only dates in European format
-        fig.update_xaxes(
-            tickformat="%d/%m/%Y",
-            dtick="D1"
-        )
-        st.plotly_chart(fig)
+        # Progress chart, rebuilt only when the exercise's history changes
+        revision = data_handler.get_exercise_revision(workout, exercise)
+        st.plotly_chart(progress_chart(workout, exercise, revision, start, exercise_data))
 
         # History table
         st.subheader("Exercise History")
         # Create a copy of the dataframe to avoid modifying the original
         display_data = exercise_data.copy()
         # Format the date column for display
-        display_data['Date'] = display_data['Date'].apply(lambda x: x.strftime('%d/%m/%Y'))
+        display_data['Date'] = display_data['Date'].dt.strftime('%d/%m/%Y')
         st.dataframe(
             display_data[['Date', 'Sets', 'Reps', 'Weight']]
-            .sort_values('Date', ascending=False)
+            .iloc[::-1]
+        )
+
+def render_dashboard(data_handler):
+    """Render volume, records and rep ranges of all exercises"""
+    dashboard = compute_dashboard(data_handler.get_history(ascending=True))
+    if dashboard is None:
+        st.warning("No workout history available")
+        return
+
+    freq = st.radio("Volume per", ["Week", "Month"], horizontal=True)
+    # Bucketed by SQLite on the day numbers, the frame is only built to draw it
+    volume = pd.DataFrame(
+        data_handler.get_history_buckets(freq.lower()),
+        columns=['Period', 'Workout', 'Exercise', 'Sessions', 'Volume', 'BestWeight']
+    )
+
+    # Stack the exercises of a workout, one chart for all of them
+    fig = px.bar(
+        volume,
+        x='Period',
+        y='Volume',
+        color='Workout',
+        hover_data=['Exercise'],
+        title=f'Volume per {freq.lower()} (reps x kg over all sets)'
+    )
+    fig.update_xaxes(tickformat="%d/%m/%Y")
+    st.plotly_chart(fig)
+
+    st.subheader("Personal Records")
+    records = dashboard['latest_records'].copy()
+    records['Date'] = records['Date'].dt.strftime('%d/%m/%Y')
+    st.dataframe(
+        records[['Workout', 'Exercise', 'BestWeight', 'BestE1RM', 'Date']]
+        .rename(columns={'BestWeight': 'Best Weight', 'BestE1RM': 'Best e1RM', 'Date': 'Last Session'})
+        .round(1),
+        hide_index=True
+    )
+
+    st.subheader("Rep Ranges")
+    rep_ranges = dashboard['rep_ranges'].pivot_table(
+        index=['Workout', 'Exercise'],
+        columns='RepRange',
+        values='Sessions',
+        fill_value=0,
+        observed=True
+    )
+    st.dataframe(rep_ranges)
+
+def render_debug_panel(tracer, rerun, cache_stats=None):
+    """Render the query trace of a rerun and the query cache counters in the sidebar"""
+    if rerun is None:
+        return
+    trace = rerun.to_dict()
+
+    with st.sidebar.expander("🐢 Query trace", expanded=True):
+        st.metric("Rerun", f"{trace['seconds'] * 1000:.1f} ms")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Queries", trace['query_count'], help=f"{trace['query_seconds'] * 1000:.1f} ms")
+        with col2:
+            st.metric("DataFrames", trace['frame_count'], help=f"{trace['frame_seconds'] * 1000:.1f} ms, {trace['frame_rows']} rows")
+
+        if cache_stats is not None:
+            # Counted over all sessions since the app started
+            hit_rate = f"{cache_stats['hit_rate'] * 100:.0f}%" if cache_stats['hit_rate'] is not None else "-"
+            st.metric(
+                "Query cache hits",
+                hit_rate,
+                help=f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions, {cache_stats['entries']} entries"
+            )
+
+        if trace['statements']:
+            statements = pd.DataFrame(trace['statements'])
+            statements['ms'] = statements.pop('seconds') * 1000
+            st.dataframe(statements[['ms', 'count', 'rows', 'sql']].round(3), hide_index=True)
+
+        st.download_button(
+            "Export traces (JSON lines)",
+            tracer.to_jsonl(),
+            file_name="query_trace.jsonl",
+            mime="application/json"
         )
@@ -0,0 +1,146 @@
+import queue
+import sqlite3 as sql
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+class ConnectionPool:
+    """SQLite connections for many threads: pooled readers and one writer thread
+
+    Reads check out a connection of their own, so sessions read concurrently
+    (the database runs in WAL mode). Writes from all threads are queued to a
+    single writer thread, which applies whatever has queued up in one
+    transaction with a savepoint per write, so writers never contend for the
+    database lock.
+
+    With version_sql, a query of a number every commit changes, the writer
+    reads it as each transaction starts and ends and once committed calls
+    on_commit(before, after), so commits of other connections can be told
+    apart from its own.
+    """
+    def __init__(self, db_path, pragmas=(), timeout=30, max_idle_readers=16, version_sql=None, on_commit=None):
+        self.db_path = db_path
+        self.pragmas = list(pragmas)
+        self.timeout = timeout
+        self.max_idle_readers = max_idle_readers
+        self.version_sql = version_sql
+        self.on_commit = on_commit
+        self._idle_readers = []
+        self._readers_lock = threading.Lock()
+        self._closed = False
+
+        self._writer = self._connect()
+        self._queue = queue.Queue()
+        self._writer_thread = threading.Thread(target=self._run_writer, name="sqlite-writer", daemon=True)
+        self._writer_thread.start()
+
+    def _connect(self):
+        """Open a connection, handed between threads but only used by one at a time"""
+        # Autocommit, transactions are started explicitly by the writer
+        conn = sql.connect(self.db_path, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Check out a read connection for the current thread"""
+        with self._readers_lock:
+            conn = self._idle_readers.pop() if self._idle_readers else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            with self._readers_lock:
+                if not self._closed and len(self._idle_readers) < self.max_idle_readers:
+                    self._idle_readers.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def submit(self, func):
+        """Queue func(connection) for the writer thread, returns a Future of its result"""
+        if self._closed:
+            raise sql.ProgrammingError("Cannot write to a closed connection pool")
+        future = Future()
+        self._queue.put((func, future))
+        return future
+
+    def write(self, func):
+        """Run func(connection) on the writer thread and wait until it is committed"""
+        return self.submit(func).result()
+
+    def _run_writer(self):
+        """Apply queued writes, everything queued so far in one transaction"""
+        while True:
+            jobs = [self._queue.get()]
+            while True:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(job is None for job in jobs)
+            jobs = [job for job in jobs if job is not None]
+            if jobs:
+                self._apply(jobs)
+            if stop:
+                self._writer.close()
+                return
+
+    def _apply(self, jobs):
+        """Run jobs in one transaction, a failing job only rolls back its own savepoint"""
+        results = []
+        try:
+            self._writer.execute("BEGIN IMMEDIATE")
+            before = self._version()
+            for func, future in jobs:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._writer.execute("SAVEPOINT job")
+                try:
+                    results.append((future, func(self._writer), None))
+                    self._writer.execute("RELEASE job")
+                except Exception as error:
+                    self._writer.execute("ROLLBACK TO job")
+                    self._writer.execute("RELEASE job")
+                    results.append((future, None, error))
+            after = self._version()
+            self._writer.execute("COMMIT")
+        except Exception as error:
+            if self._writer.in_transaction:
+                self._writer.execute("ROLLBACK")
+            for func, future in jobs:
+                if not future.done():
+                    if not future.running():
+                        future.set_running_or_notify_cancel()
+                    future.set_exception(error)
+            return
+
+        if self.on_commit is not None:
+            self.on_commit(before, after)
+        # Only report success once the transaction is durable
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _version(self):
+        """Read version_sql on the writer, None without one"""
+        if self.version_sql is None:
+            return None
+        return self._writer.execute(self.version_sql).fetchone()[0]
+
+    def close(self):
+        """Finish the queued writes and close all connections"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer_thread.join()
+        with self._readers_lock:
+            for conn in self._idle_readers:
+                conn.close()
+            self._idle_readers = []
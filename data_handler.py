@@ -1,21 +1,606 @@
+import numpy as np
 import pandas as pd
 import sqlite3 as sql
 import os
+import threading
+import time
+import atexit
+from collections import namedtuple
+from contextlib import contextmanager
 from datetime import datetime
+from connection_pool import ConnectionPool
+from dates import WEEK_SQL, MONTH_SQL, to_day, from_day, week_start, month_start
+from query_cache import QueryCache
+from history_io import read_history_chunks, write_history_chunks
+from workout_sets import WorkoutSet, pack_sets, unpack_sets, rollup_sets
 
-class DataHandler:
+# Ordered schema migrations as (method name, runs inside a transaction). The
+# database records how many have been applied in PRAGMA user_version, so only
+# ever append to this list.
+MIGRATIONS = [
+    ('_migrate_initial_schema', True),
+    ('_migrate_history_indexes', True),
+    ('_migrate_wal_journal', False),
+    ('_migrate_exercise_stats', True),
+    ('_migrate_exercise_revisions', True),
+    ('_migrate_day_numbers', True),
+    ('_migrate_history_sets', True),
+    ('_migrate_data_revision', True),
+]
+
+# Estimated one rep max of a History row (Epley), a single rep is taken as is
+E1RM_SQL = "CASE WHEN {row}.reps <= 1 THEN {row}.weight ELSE {row}.weight * (1 + {row}.reps / 30.0) END"
+
+# Volume of a History row. Rows logged per set keep the exact sum over their
+# sets in volume, before migration 7 there was no such column.
+VOLUME_SQL = "COALESCE({row}.volume, {row}.sets * {row}.reps * {row}.weight)"
+LEGACY_VOLUME_SQL = "{row}.sets * {row}.reps * {row}.weight"
+
+# ExerciseStats rows computed from the History rows matching {where}, {volume}
+# is the volume of a History row
+STATS_SELECT_SQL = """
+INSERT INTO ExerciseStats (workout_id, exercise_id, first_date, first_weight, last_date, last_weight,
+    best_weight, best_e1rm, sessions, volume)
+SELECT Totals.workout_id, Totals.exercise_id, First.date, First.weight, Last.date, Last.weight,
+    Totals.best_weight, Totals.best_e1rm, Totals.sessions, Totals.volume
+FROM (
+    SELECT workout_id, exercise_id, MAX(weight) AS best_weight,
+        MAX(""" + E1RM_SQL.format(row="History") + """) AS best_e1rm,
+        COUNT(*) AS sessions, SUM({volume}) AS volume
+    FROM History
+    WHERE {where}
+    GROUP BY workout_id, exercise_id
+) AS Totals
+JOIN History AS First ON First.id = (
+    SELECT id FROM History
+    WHERE exercise_id = Totals.exercise_id AND workout_id = Totals.workout_id
+    ORDER BY date ASC LIMIT 1
+)
+JOIN History AS Last ON Last.id = (
+    SELECT id FROM History
+    WHERE exercise_id = Totals.exercise_id AND workout_id = Totals.workout_id
+    ORDER BY date DESC LIMIT 1
+);
+"""
+
+# Trigger body that rebuilds the stats of one exercise, {row} is OLD or NEW.
+# Leaves no row when the exercise has no history left.
+RECOMPUTE_STATS_SQL = """
+DELETE FROM ExerciseStats WHERE workout_id = {row}.workout_id AND exercise_id = {row}.exercise_id;
+""" + STATS_SELECT_SQL.replace("{where}", "exercise_id = {row}.exercise_id AND workout_id = {row}.workout_id")
+
+# The triggers keeping ExerciseStats current, {volume} is the volume of a row.
+# A new row can only extend the aggregates.
+STATS_INSERT_TRIGGER_SQL = """
+CREATE TRIGGER IF NOT EXISTS History_stats_insert AFTER INSERT ON History
+BEGIN
+    INSERT INTO ExerciseStats (workout_id, exercise_id, first_date, first_weight, last_date, last_weight,
+        best_weight, best_e1rm, sessions, volume)
+    VALUES (NEW.workout_id, NEW.exercise_id, NEW.date, NEW.weight, NEW.date, NEW.weight,
+        NEW.weight, """ + E1RM_SQL.format(row="NEW") + """, 1, {volume})
+    ON CONFLICT(workout_id, exercise_id) DO UPDATE SET
+        first_date = MIN(first_date, excluded.first_date),
+        first_weight = CASE WHEN excluded.first_date < first_date THEN excluded.first_weight ELSE first_weight END,
+        last_date = MAX(last_date, excluded.last_date),
+        last_weight = CASE WHEN excluded.last_date > last_date THEN excluded.last_weight ELSE last_weight END,
+        best_weight = MAX(best_weight, excluded.best_weight),
+        best_e1rm = MAX(best_e1rm, excluded.best_e1rm),
+        sessions = sessions + 1,
+        volume = volume + excluded.volume;
+END
+"""
+
+# Deletes can lower a best or move the first/last entry, so the affected
+# exercise is rebuilt from its rows in the exercise index
+STATS_DELETE_TRIGGER_SQL = """
+CREATE TRIGGER IF NOT EXISTS History_stats_delete AFTER DELETE ON History
+BEGIN
+""" + RECOMPUTE_STATS_SQL.format(row="OLD", volume="{volume}") + """
+END
+"""
+
+# Updates can do both, so the old and the new exercise are rebuilt
+STATS_UPDATE_TRIGGER_SQL = """
+CREATE TRIGGER IF NOT EXISTS History_stats_update AFTER UPDATE ON History
+BEGIN
+""" + RECOMPUTE_STATS_SQL.format(row="OLD", volume="{volume}") + """
+""" + RECOMPUTE_STATS_SQL.format(row="NEW", volume="{volume}") + """
+END
+"""
+
+# History bucketed per week or month, WEEK_SQL and MONTH_SQL number the periods
+BUCKETS_SQL = """
+SELECT {bucket} AS bucket, workout_id, exercise_id,
+    COUNT(*), SUM(""" + VOLUME_SQL.format(row="History") + """), MAX(weight)
+FROM History
+{where}
+GROUP BY bucket, workout_id, exercise_id
+ORDER BY bucket, workout_id, exercise_id
+"""
+
+# Statements apply_batch runs with executemany
+BATCH_DELETE_SQL = """
+DELETE FROM History
+WHERE date = ? AND workout_id = ? AND exercise_id = ?
+"""
+
+# A plain upsert clears the volume, which drops the row's sets through History_sets_update
+BATCH_UPSERT_SQL = """
+INSERT INTO History (date, workout_id, exercise_id, sets, reps, weight)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(date, workout_id, exercise_id)
+DO UPDATE SET
+    sets = excluded.sets,
+    reps = excluded.reps,
+    weight = excluded.weight,
+    volume = NULL;
+"""
+
+# Rows logged per set are upserted with their rollup, then their packed sets
+BATCH_ROLLUP_UPSERT_SQL = """
+INSERT INTO History (date, workout_id, exercise_id, sets, reps, weight, volume)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(date, workout_id, exercise_id)
+DO UPDATE SET
+    sets = excluded.sets,
+    reps = excluded.reps,
+    weight = excluded.weight,
+    volume = excluded.volume;
+"""
+
+BATCH_SETS_SQL = """
+INSERT INTO HistorySets (history_id, sets)
+SELECT id, ? FROM History
+WHERE date = ? AND workout_id = ? AND exercise_id = ?
+ON CONFLICT(history_id)
+DO UPDATE SET
+    sets = excluded.sets;
+"""
+
+BATCH_MAX_SQL = """
+INSERT INTO Max (workout_id, exercise_id, max)
+VALUES (?, ?, ?)
+ON CONFLICT(workout_id, exercise_id)
+DO UPDATE SET
+    max = excluded.max;
+"""
+
+# Changes whenever a workout or exercise is added or removed, by any process
+CATALOG_VERSION_SQL = """
+SELECT (SELECT MAX(id) FROM Workouts), (SELECT COUNT(*) FROM Workouts),
+    (SELECT MAX(id) FROM Exercises), (SELECT COUNT(*) FROM Exercises)
+"""
+
+# Seconds a loaded catalog is used before it is checked against CATALOG_VERSION_SQL
+CATALOG_CHECK_SECONDS = 1.0
+
+# Bumped by every write to the tables reads are cached from, by any process
+REVISION_SQL = "SELECT revision FROM DataRevision"
+
+# Per-connection settings, these are not stored in the database file
+CONNECTION_PRAGMAS = [
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 30000",
+]
+
+# --- Prepopulate Data ---
+WORKOUTS_EXERCISES = [
+    ('Push', 'Shoulder'),
+    ('Push', 'Bench'),
+    ('Push', 'Incline bench'),
+    ('Push', 'Triceps'),
+    ('Push', 'Horizontal Raises'),
+    ('Push', 'Fly-overs'),
+    ('Push', 'Cable pull'),
+    ('Push', 'Incline press'),
+    ('Pull', 'Onderrug'),
+    ('Pull', 'Bicep curl'),
+    ('Pull', 'Pull-over'),
+    ('Pull', 'Pull-down'),
+    ('Pull', 'Seated row'),
+    ('Pull', 'Row'),
+    ('Pull', 'Hammer curls'),
+    ('Pull', 'Pull-up'),
+    ('Legs', 'Leg press'),
+    ('Legs', 'Seated leg curls'),
+    ('Legs', 'Back seated leg curls'),
+    ('Legs', 'Kuiten'),
+    ('Legs', 'Abductor'),
+    ('Core', 'Abdominal crunch'),
+    ('Core', 'Buikspier rood')
+]
+
+# One logged exercise on a day, what single entry lookups return
+WorkoutEntry = namedtuple('WorkoutEntry', ['date', 'sets', 'reps', 'weight'])
+
+# Rows written by an import, and rows skipped as their exercise belongs to another workout
+ImportResult = namedtuple('ImportResult', ['rows', 'skipped'])
+
+# Total volume, sessions and best weight of an exercise over a week or month
+HistoryBucket = namedtuple('HistoryBucket', ['start', 'workout', 'exercise', 'sessions', 'volume', 'best_weight'])
+
+class HistoryColumns:
+    """History rows held as one array per column, made a DataFrame only where it is drawn"""
+    __slots__ = ('days', 'workouts', 'exercises', 'sets', 'reps', 'weights', 'volumes')
+
+    def __init__(self, rows, catalog):
+        # rows are (day, workout_id, exercise_id, sets, reps, weight, volume)
+        days, workout_ids, exercise_ids, sets, reps, weights, volumes = zip(*rows)
+        self.days = np.array(days, dtype=np.int64)
+        self.workouts = tuple(map(catalog.workout_names.get, workout_ids))
+        self.exercises = tuple(map(catalog.exercise_names.get, exercise_ids))
+        self.sets = np.array(sets, dtype=np.int64)
+        self.reps = np.array(reps, dtype=np.int64)
+        self.weights = np.array(weights, dtype=np.float64)
+        self.volumes = np.array(volumes, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.days)
+
+    def to_dict(self):
+        """Get the columns keyed on the DataFrame column names"""
+        return {
+            # Day numbers are numpy's datetime64[D] as is
+            'Date': self.days.astype('datetime64[D]'),
+            'Workout': self.workouts,
+            'Exercise': self.exercises,
+            'Sets': self.sets,
+            'Reps': self.reps,
+            'Weight': self.weights,
+            'Volume': self.volumes
+        }
+
+    def to_frame(self):
+        return pd.DataFrame(self.to_dict())
+
+class Catalog:
+    """Workouts and exercises with their ids in plain dicts and tuples"""
+    def __init__(self, workout_rows, exercise_rows, version=None):
+        # workout_rows are (id, name), exercise_rows (workout_id, id, name),
+        # version the CATALOG_VERSION_SQL row they were read at
+        self.version = version
+        self.workout_ids = {name: workout_id for workout_id, name in workout_rows}
+        self.workout_names = {workout_id: name for workout_id, name in workout_rows}
+        self.workouts = tuple(self.workout_ids)
+        self.exercise_ids = {name: exercise_id for _, exercise_id, name in exercise_rows}
+        self.exercise_names = {exercise_id: name for _, exercise_id, name in exercise_rows}
+
+        by_workout = {workout: [] for workout in self.workouts}
+        self.names = {}
+        # Exercise names are unique, so each names its workout
+        self.exercise_workouts = {}
+        for workout_id, exercise_id, name in exercise_rows:
+            # The exercises are read after the workouts, so they can name a newer one
+            workout = self.workout_names.get(workout_id)
+            if workout is None:
+                continue
+            by_workout[workout].append(name)
+            self.names[(workout_id, exercise_id)] = (workout, name)
+            self.exercise_workouts[name] = workout
+        self.exercises_by_workout = {workout: tuple(names) for workout, names in by_workout.items()}
+        self.exercises = tuple(
+            (workout, exercise)
+            for workout, exercises in self.exercises_by_workout.items()
+            for exercise in exercises
+        )
+
+    def ids(self, workout, exercise):
+        """Get the (workout_id, exercise_id) for a pair of names, None if unknown
+
+        An exercise belongs to one workout, paired with another it is unknown too.
+        """
+        ids = (self.workout_ids.get(workout), self.exercise_ids.get(exercise))
+        if ids not in self.names:
+            return None
+        return ids
+
+class WriteBatch:
+    """Collects workout and max writes to apply them in one transaction"""
     def __init__(self):
-        self.conn = sql.connect('data/data.db')
-        self.cursor = self.conn.cursor()
-        self.workouts = "data/workouts.csv"
-        self.exercises = "data/exercises.csv"
-        self.history = "data/history.csv"
+        # Keyed on what a row is unique on, so the last write to a row wins
+        # Values are (sets, reps, weight), plus the WorkoutSet tuple when logged per set
+        self.workouts = {}
+        self.maxes = {}
+        self.changes = None
+
+    def save_workout(self, date, workout, exercise, sets, reps, weight):
+        """Queue a workout entry upsert"""
+        self.workouts[(to_day(date), workout, exercise)] = (sets, reps, weight)
+
+    def save_sets(self, date, workout, exercise, sets):
+        """Queue a workout entry logged per set, a list of WorkoutSet or (reps, weight[, rpe])"""
+        # Round trip so the rollup is made of the values as stored
+        sets = tuple(unpack_sets(pack_sets(sets)))
+        if not sets:
+            self.delete_workout(date, workout, exercise)
+            return
+        self.workouts[(to_day(date), workout, exercise)] = rollup_sets(sets)[:3] + (sets,)
+
+    def delete_workout(self, date, workout, exercise):
+        """Queue a workout entry delete"""
+        self.workouts[(to_day(date), workout, exercise)] = None
+
+    def save_max(self, workout, exercise, max_weight):
+        """Queue a max weight upsert"""
+        self.maxes[(workout, exercise)] = max_weight
+
+    def __len__(self):
+        return len(self.workouts) + len(self.maxes)
+
+class DataHandler:
+    def __init__(self, db_path='data/data.db', tracer=None, write_behind=False, cache_size=256):
+        self.db_path = db_path
+        # Optional tracing.QueryTracer, only reruns it was started for are timed
+        self.tracer = tracer
+        self._lock = threading.RLock()
+        self._catalog = None
+        self._catalog_checked = 0.0
+        # Read results are reused until a write through this handler touches
+        # them, or until another process writes the database
+        self._cache = QueryCache(cache_size) if cache_size else None
+        # The DataRevision the cache was last checked at, and the before -> after
+        # revisions of our own commits, which only expire what they touched
+        self._revision = None
+        self._own_commits = {}
+        self._revision_lock = threading.Lock()
         self._initialize_data_files()
+        # The handler is shared by all Streamlit sessions, which each run on their
+        # own thread: reads get a pooled connection each, writes are serialized
+        # through the pool's writer thread
+        if self._cache is not None:
+            self._pool = ConnectionPool(db_path, CONNECTION_PRAGMAS, version_sql=REVISION_SQL, on_commit=self._own_commit)
+            # Checked before every cached read, a connection of its own skips the pool
+            self._revision_conn = sql.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        else:
+            self._pool = ConnectionPool(db_path, CONNECTION_PRAGMAS)
+
+        # In write-behind mode writes return once queued. Until they are committed
+        # their values are kept here, keyed like the rows, so reads still see them.
+        self.write_behind = write_behind
+        self.failed_writes = []
+        self._pending_lock = threading.Lock()
+        self._pending_sequence = 0
+        self._pending_history = {}
+        self._pending_max = {}
+        if write_behind:
+            atexit.register(self.close)
+
+    def close(self):
+        """Commit the queued writes and close the database connections"""
+        self._pool.close()
+        if self._cache is not None:
+            self._revision_conn.close()
+
+    def flush(self):
+        """Wait until every queued write is committed, raises the first one that failed"""
+        # The writer works in order, so once this no-op is done so is everything before it
+        self._pool.write(lambda conn: None)
+        with self._pending_lock:
+            failed, self.failed_writes = self.failed_writes, []
+        if failed:
+            raise failed[0]
 
     def _initialize_data_files(self):
-        """Initialize data files if they don't exist"""
+        """Bring the database up to the latest migration"""
+        conn = sql.connect(self.db_path, timeout=30)
+        try:
+            cursor = conn.cursor()
+            for pragma in CONNECTION_PRAGMAS:
+                cursor.execute(pragma)
+            self._run_migrations(cursor)
+        finally:
+            conn.close()
+        self._invalidate_catalog()
+
+    def _get_user_version(self, cursor):
+        """Get the number of migrations applied to the database"""
+        return cursor.execute("PRAGMA user_version").fetchone()[0]
+
+    def _run_migrations(self, cursor):
+        """Apply all pending migrations in order, skipped when up to date"""
+        while self._get_user_version(cursor) < len(MIGRATIONS):
+            version = self._get_user_version(cursor)
+            name, in_transaction = MIGRATIONS[version]
+            if not in_transaction:
+                getattr(self, name)(cursor)
+                cursor.execute(f"PRAGMA user_version = {version + 1}")
+                continue
+
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have migrated while we waited for the lock
+                if self._get_user_version(cursor) == version:
+                    getattr(self, name)(cursor)
+                    cursor.execute(f"PRAGMA user_version = {version + 1}")
+                cursor.connection.commit()
+            except Exception:
+                cursor.connection.rollback()
+                raise
+
+    def _migrate_initial_schema(self, cursor):
+        """Migration 1: create and seed the tables"""
+        self._create_schema(cursor)
+        self._seed_data(cursor)
+
+    def _migrate_history_indexes(self, cursor):
+        """Migration 2: index History by exercise for the last entry lookups"""
+        # The UNIQUE(date, ...) index leads with date, so "latest entry before date
+        # for this exercise" had to scan. This one seeks on the exercise and walks
+        # its dates newest first without touching the table.
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS History_exercise_date
+        ON History (exercise_id, date DESC, workout_id, sets, reps, weight)
+        """)
+
+        # Exercises are listed per workout
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS Exercises_workout
+        ON Exercises (workout_id)
+        """)
+
+    def _migrate_wal_journal(self, cursor):
+        """Migration 3: switch to write-ahead logging"""
+        # Readers no longer block the writer, the mode is stored in the file.
+        # It cannot be changed inside a transaction.
+        cursor.execute("PRAGMA journal_mode = WAL")
+
+    def _migrate_exercise_stats(self, cursor):
+        """Migration 4: per exercise aggregates kept current by History triggers"""
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ExerciseStats (
+            workout_id INTEGER NOT NULL,
+            exercise_id INTEGER NOT NULL,
+            first_date DATE NOT NULL,
+            first_weight REAL NOT NULL,
+            last_date DATE NOT NULL,
+            last_weight REAL NOT NULL,
+            best_weight REAL NOT NULL,
+            best_e1rm REAL NOT NULL,
+            sessions INTEGER NOT NULL,
+            volume REAL NOT NULL,
+            PRIMARY KEY (workout_id, exercise_id)
+        ) WITHOUT ROWID
+        """)
+
+        # Also backfills them from the existing history
+        self._create_stats_triggers(cursor, LEGACY_VOLUME_SQL)
+
+    def _migrate_exercise_revisions(self, cursor):
+        """Migration 5: count the History changes per exercise, to key cached results on"""
+        # Rows are never deleted, so a revision is never handed out twice
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ExerciseRevisions (
+            workout_id INTEGER NOT NULL,
+            exercise_id INTEGER NOT NULL,
+            revision INTEGER NOT NULL,
+            PRIMARY KEY (workout_id, exercise_id)
+        ) WITHOUT ROWID
+        """)
+
+        bump = """
+            INSERT INTO ExerciseRevisions (workout_id, exercise_id, revision)
+            VALUES ({row}.workout_id, {row}.exercise_id, 1)
+            ON CONFLICT(workout_id, exercise_id) DO UPDATE SET revision = revision + 1;
+        """
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS History_revision_insert AFTER INSERT ON History
+        BEGIN
+        """ + bump.format(row="NEW") + """
+        END
+        """)
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS History_revision_delete AFTER DELETE ON History
+        BEGIN
+        """ + bump.format(row="OLD") + """
+        END
+        """)
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS History_revision_update AFTER UPDATE ON History
+        BEGIN
+        """ + bump.format(row="OLD") + bump.format(row="NEW") + """
+        END
+        """)
+
+    def _migrate_day_numbers(self, cursor):
+        """Migration 6: store History dates as day numbers, the days since 1970-01-01"""
+        # Rebuilding the stats once beats the update trigger rebuilding them per row
+        cursor.execute("DROP TRIGGER IF EXISTS History_stats_update")
+        # Any ISO date or date time text becomes its day. Should two rows of an
+        # exercise land on the same day, the one converted last is kept.
+        cursor.execute("""
+        UPDATE OR REPLACE History
+        SET date = CAST(julianday(date) - 2440587.5 AS INTEGER)
+        WHERE typeof(date) != 'integer'
+        """)
+        self._create_stats_triggers(cursor, LEGACY_VOLUME_SQL)
+
+        # The column keeps its DATE type, so refuse anything that is not a day number
+        for event in ['INSERT', 'UPDATE OF date']:
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS History_day_number_{event.split()[0].lower()} BEFORE {event} ON History
+            WHEN typeof(NEW.date) != 'integer'
+            BEGIN
+                SELECT RAISE(ABORT, 'History.date must be a day number');
+            END
+            """)
+
+    def _migrate_history_sets(self, cursor):
+        """Migration 7: per-set detail of History rows, packed in one BLOB per row"""
+        # History keeps one row per exercise per day with the rollup of its sets,
+        # which every existing read uses. Only the volume can't be rolled up into
+        # sets, reps and weight, it is NULL for rows that were not logged per set.
+        cursor.execute("ALTER TABLE History ADD COLUMN volume REAL")
+        # The exercise index covers the history reads, which now read the volume
+        cursor.execute("DROP INDEX IF EXISTS History_exercise_date")
+        cursor.execute("""
+        CREATE INDEX History_exercise_date
+        ON History (exercise_id, date DESC, workout_id, sets, reps, weight, volume)
+        """)
+        # Keyed on the History rowid, so the table is its own index
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS HistorySets (
+            history_id INTEGER PRIMARY KEY,
+            sets BLOB NOT NULL
+        )
+        """)
+
+        # The stats now sum the volume column where there is one
+        for name in ['History_stats_insert', 'History_stats_delete', 'History_stats_update']:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        self._create_stats_triggers(cursor, VOLUME_SQL)
+
+        # Sets go with their row, and when a plain save replaces the rollup
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS History_sets_delete AFTER DELETE ON History
+        BEGIN
+            DELETE FROM HistorySets WHERE history_id = OLD.id;
+        END
+        """)
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS History_sets_update AFTER UPDATE ON History
+        WHEN NEW.volume IS NULL
+        BEGIN
+            DELETE FROM HistorySets WHERE history_id = NEW.id;
+        END
+        """)
+
+    def _migrate_data_revision(self, cursor):
+        """Migration 8: a revision every write bumps, so cached reads notice the writes of other processes"""
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS DataRevision (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            revision INTEGER NOT NULL
+        )
+        """)
+        cursor.execute("INSERT OR IGNORE INTO DataRevision (id, revision) VALUES (1, 0)")
+        # ExerciseStats and ExerciseRevisions only change along with History
+        for table in ['Workouts', 'Exercises', 'History', 'HistorySets', 'Max']:
+            for event in ['INSERT', 'UPDATE', 'DELETE']:
+                cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_data_revision_{event.lower()} AFTER {event} ON {table}
+                BEGIN
+                    UPDATE DataRevision SET revision = revision + 1 WHERE id = 1;
+                END
+                """)
+
+    def _create_stats_triggers(self, cursor, volume_sql):
+        """Create the ExerciseStats triggers that don't exist and rebuild the stats
+
+        volume_sql is the volume of a {row} of History.
+        """
+        history_volume = volume_sql.format(row="History")
+        cursor.execute(STATS_INSERT_TRIGGER_SQL.format(volume=volume_sql.format(row="NEW")))
+        cursor.execute(STATS_DELETE_TRIGGER_SQL.format(volume=history_volume))
+        cursor.execute(STATS_UPDATE_TRIGGER_SQL.format(volume=history_volume))
+        cursor.execute("DELETE FROM ExerciseStats")
+        cursor.execute(STATS_SELECT_SQL.format(where="1", volume=history_volume))
+
+    def _create_schema(self, cursor):
+        """Create the tables if they don't exist"""
         # Create Workouts table
-        self.cursor.execute("""
+        cursor.execute("""
         CREATE TABLE IF NOT EXISTS Workouts (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL UNIQUE
@@ -23,7 +608,7 @@ class DataHandler:
         """)
 
         # Create Exercises table
-        self.cursor.execute("""
+        cursor.execute("""
         CREATE TABLE IF NOT EXISTS Exercises (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             workout_id INTEGER NOT NULL,
@@ -33,7 +618,7 @@ class DataHandler:
         """)
 
         # Create History table
-        self.cursor.execute("""
+        cursor.execute("""
         CREATE TABLE IF NOT EXISTS History (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             date DATE NOT NULL,
@@ -49,7 +634,7 @@ class DataHandler:
         """)
 
         # Create Max table
-        self.cursor.execute("""
+        cursor.execute("""
         CREATE TABLE IF NOT EXISTS Max (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             workout_id INTEGER NOT NULL,
@@ -61,204 +646,885 @@ class DataHandler:
         )
         """)
 
-        # Commit and close connection
-        self.conn.commit()
-
-        # --- Prepopulate Data ---
-        workouts_exercises = [
-            ('Push', 'Shoulder'),
-            ('Push', 'Bench'),
-            ('Push', 'Incline bench'),
-            ('Push', 'Triceps'),
-            ('Push', 'Horizontal Raises'),
-            ('Push', 'Fly-overs'),
-            ('Push', 'Cable pull'),
-            ('Push', 'Incline press'),
-            ('Pull', 'Onderrug'),
-            ('Pull', 'Bicep curl'),
-            ('Pull', 'Pull-over'),
-            ('Pull', 'Pull-down'),
-            ('Pull', 'Seated row'),
-            ('Pull', 'Row'),
-            ('Pull', 'Hammer curls'),
-            ('Pull', 'Pull-up'),
-            ('Legs', 'Leg press'),
-            ('Legs', 'Seated leg curls'),
-            ('Legs', 'Back seated leg curls'),
-            ('Legs', 'Kuiten'),
-            ('Legs', 'Abductor'),
-            ('Core', 'Abdominal crunch'),
-            ('Core', 'Buikspier rood')
-        ]
-
+    def _seed_data(self, cursor):
+        """Insert the default workouts, exercises and maxes"""
         # Insert Workouts
-        for workout, _ in workouts_exercises:
-            self.cursor.execute("INSERT OR IGNORE INTO Workouts (name) VALUES (?)", (workout,))
-        
-        # Commit changes
-        self.conn.commit()
-        
+        cursor.executemany(
+            "INSERT OR IGNORE INTO Workouts (name) VALUES (?)",
+            [(workout,) for workout, _ in WORKOUTS_EXERCISES]
+        )
+
         # Insert Exercises
-        for workout, exercise in workouts_exercises:
-            workout_id = self.cursor.execute("SELECT id FROM Workouts WHERE name = ?", (workout,)).fetchall()[0][0]
-            self.cursor.execute("""
-            INSERT OR IGNORE INTO Exercises (workout_id, name) 
-            VALUES (?, ?)
-            """, (workout_id, exercise))
-        
-        # Commit changes
-        self.conn.commit()
+        cursor.executemany("""
+        INSERT OR IGNORE INTO Exercises (workout_id, name)
+        SELECT id, ? FROM Workouts WHERE name = ?
+        """, [(exercise, workout) for workout, exercise in WORKOUTS_EXERCISES])
 
         # Insert Max
-        for workout, exercise in workouts_exercises:
-            workout_id, exercise_id = self.cursor.execute("SELECT workout_id, id FROM Exercises WHERE name = ?", (exercise,)).fetchall()[0]
-            
-            self.cursor.execute("""
-            INSERT OR IGNORE INTO Max (workout_id, exercise_id, max) 
-            VALUES (?, ?, 0)
-            """, (workout_id, exercise_id))
-
-        # Commit changes
-        self.conn.commit()
+        cursor.execute("""
+        INSERT OR IGNORE INTO Max (workout_id, exercise_id, max)
+        SELECT workout_id, id, 0 FROM Exercises
+        """)
+
+    def _rerun(self):
+        """Get the trace of the current rerun, None when it is not traced"""
+        if self.tracer is None:
+            return None
+        return self.tracer.current()
+
+    def _fetchall(self, query, params=()):
+        """Run a read query and return all rows"""
+        rerun = self._rerun()
+        if rerun is None:
+            with self._pool.reader() as conn:
+                return conn.execute(query, params).fetchall()
+
+        start = time.perf_counter()
+        with self._pool.reader() as conn:
+            rows = conn.execute(query, params).fetchall()
+        self.tracer.record_query(rerun, query, time.perf_counter() - start, len(rows))
+        return rows
+
+    def _execute_write(self, query, params=(), history=(), maxes=()):
+        """Run a write query on the writer thread, see _submit_write"""
+        rerun = self._rerun()
+        start = time.perf_counter()
+        changes = self._submit_write(lambda conn: conn.execute(query, params).rowcount, history, maxes)
+        if rerun is not None:
+            self.tracer.record_query(rerun, query, time.perf_counter() - start, changes or 0)
+
+    def _submit_write(self, func, history=(), maxes=()):
+        """Run func(connection) on the writer thread
+
+        Waits for the commit and returns the result. In write-behind mode it
+        only queues func and returns None, the (day, workout_id, exercise_id)
+        -> WriteBatch workout values or None items of history and the
+        (workout_id, exercise_id) -> max items of maxes stay readable until
+        the write is committed.
+        """
+        if not self.write_behind:
+            try:
+                return self._pool.write(func)
+            finally:
+                self._invalidate_cache(history, maxes)
+
+        with self._pending_lock:
+            self._pending_sequence += 1
+            sequence = self._pending_sequence
+            for key, values in history:
+                self._pending_history[key] = (sequence, values)
+            for key, value in maxes:
+                self._pending_max[key] = (sequence, value)
+
+        future = self._pool.submit(func)
+        future.add_done_callback(lambda future: self._settle_write(future, sequence, history, maxes))
+        return None
+
+    def _settle_write(self, future, sequence, history, maxes):
+        """Forget the pending values of a finished write, unless a later write replaced them"""
+        self._invalidate_cache(history, maxes)
+        with self._pending_lock:
+            for key, _ in history:
+                if self._pending_history.get(key, (None,))[0] == sequence:
+                    del self._pending_history[key]
+            for key, _ in maxes:
+                if self._pending_max.get(key, (None,))[0] == sequence:
+                    del self._pending_max[key]
+            if future.exception() is not None:
+                self.failed_writes.append(future.exception())
+
+    def _cached(self, key, scopes, load):
+        """Get a read result through the query cache, load() runs on a miss
+
+        scopes name what the result was read from: ('history',) or ('max',)
+        followed by a workout id and an exercise id to narrow it down.
+        """
+        if self._cache is None:
+            return load()
+        self._check_revision()
+        return self._cache.get_or_load(key, scopes, load)
+
+    def _own_commit(self, before, after):
+        """Remember the DataRevision a commit of our writer moved, called by the pool"""
+        if before == after:
+            return
+        with self._revision_lock:
+            # Only checks forget them, a process that never reads starts over now and then
+            if len(self._own_commits) >= 1000:
+                self._own_commits.clear()
+            self._own_commits[before] = after
+
+    def _check_revision(self):
+        """Drop every cached read if another process committed since the last check
+
+        Our own commits are followed from the last checked revision, they
+        already expired what they touched.
+        """
+        with self._revision_lock:
+            revision = self._revision_conn.execute(REVISION_SQL).fetchone()[0]
+            if revision == self._revision:
+                return
+            seen = self._revision
+            while seen != revision and seen in self._own_commits:
+                seen = self._own_commits[seen]
+            if self._revision is not None and seen != revision:
+                self._cache.clear()
+            self._revision = revision
+            # Revisions only go up, so older commits are done with
+            for before in [before for before in self._own_commits if before < revision]:
+                del self._own_commits[before]
+
+    def _invalidate_cache(self, history=(), maxes=()):
+        """Expire the cached reads of the exercises a committed write touched"""
+        if self._cache is None:
+            return
+        scopes = set()
+        for table, keys in [('history', [key[1:] for key, _ in history]), ('max', [key for key, _ in maxes])]:
+            # A read of a whole workout or of everything depends on each exercise in it
+            for workout_id, exercise_id in keys:
+                scopes.update([(table,), (table, workout_id), (table, workout_id, exercise_id)])
+        self._cache.invalidate(scopes)
+
+    def cache_stats(self):
+        """Get the query cache hit and miss counters, None when caching is off"""
+        if self._cache is None:
+            return None
+        return self._cache.stats()
+
+    def _overlay_pending(self, day, snapshot):
+        """Apply the queued writes of a day number to a day snapshot"""
+        names = self.catalog.names
+        with self._pending_lock:
+            history = list(self._pending_history.items())
+            maxes = list(self._pending_max.items())
+        for (entry_day, workout_id, exercise_id), (_, values) in history:
+            entry = snapshot.get(names.get((workout_id, exercise_id)))
+            if entry_day == day and entry is not None:
+                entry['Current'] = None if values is None else WorkoutEntry(from_day(day), *values[:3])
+        for ids, (_, value) in maxes:
+            entry = snapshot.get(names.get(ids))
+            if entry is not None:
+                entry['Max'] = value
+
+    def _frame(self, data, columns=None):
+        """Build a DataFrame from rows or a dict of columns, timed when the rerun is traced"""
+        rerun = self._rerun()
+        if rerun is None:
+            return pd.DataFrame(data=data, columns=columns)
+
+        start = time.perf_counter()
+        frame = pd.DataFrame(data=data, columns=columns)
+        self.tracer.record_frame(rerun, time.perf_counter() - start, len(frame))
+        return frame
     
+    @property
+    def catalog(self):
+        """Workouts and exercises with their ids, cached and checked for changes every CATALOG_CHECK_SECONDS"""
+        catalog = self._catalog
+        if catalog is None or time.monotonic() - self._catalog_checked > CATALOG_CHECK_SECONDS:
+            catalog = self.refresh_catalog()
+        return catalog
+
+    def refresh_catalog(self):
+        """Reload the catalog if workouts or exercises were added or removed since it was loaded
+
+        Other processes, like an import, can add them, so call this when names
+        or ids are not in the catalog before taking them as unknown.
+        """
+        with self._lock:
+            # The version is read first, a change made meanwhile shows at the next check
+            version = self._fetchall(CATALOG_VERSION_SQL)[0]
+            self._catalog_checked = time.monotonic()
+            if self._catalog is None or self._catalog.version != version:
+                if self._catalog is not None and self._cache is not None:
+                    # Cached reads may have left out the new exercises
+                    self._cache.clear()
+                self._catalog = Catalog(
+                    self._fetchall("SELECT id, name FROM Workouts ORDER BY id"),
+                    self._fetchall("SELECT workout_id, id, name FROM Exercises ORDER BY workout_id, id"),
+                    version
+                )
+            return self._catalog
+
+    def _ids(self, workout, exercise):
+        """Get the (workout_id, exercise_id) of a pair of names, None if a refreshed catalog doesn't know them either"""
+        ids = self.catalog.ids(workout, exercise)
+        if ids is None:
+            ids = self.refresh_catalog().ids(workout, exercise)
+        return ids
+
+    def _workout_id(self, workout):
+        """Get the id of a workout, None if a refreshed catalog doesn't know it either"""
+        workout_id = self.catalog.workout_ids.get(workout)
+        if workout_id is None:
+            workout_id = self.refresh_catalog().workout_ids.get(workout)
+        return workout_id
+
+    def _exercise_id(self, exercise):
+        """Get the id of an exercise, None if a refreshed catalog doesn't know it either"""
+        exercise_id = self.catalog.exercise_ids.get(exercise)
+        if exercise_id is None:
+            exercise_id = self.refresh_catalog().exercise_ids.get(exercise)
+        return exercise_id
+
+    def _invalidate_catalog(self):
+        """Drop the cached catalog, call after writing Workouts or Exercises"""
+        self._catalog = None
+        if self._cache is not None:
+            self._cache.clear()
+
     def get_workouts(self):
-        """Get list of exercises for workout"""
-        workouts = pd.DataFrame(columns=['Workout'], data=self.cursor.execute("SELECT name FROM Workouts").fetchall())
-        return workouts['Workout']
+        """Get list of workouts"""
+        return pd.Series(self.catalog.workouts, name='Workout', dtype=object)
 
     def get_exercises(self):
         """Get list of exercises for workout"""
-        exercises = pd.DataFrame(columns=['Workout', 'Exercise'], data=self.cursor.execute("SELECT w.name, e.name FROM Exercises e JOIN Workouts w ON e.workout_id = w.id").fetchall())
-        return exercises
+        return self._frame(self.catalog.exercises, ['Workout', 'Exercise'])
     
     def get_exercises_by_workout(self, workout):
         """Get list of exercises for workout"""
-        exercises = self.get_exercises()
-        return exercises[exercises['Workout'] == workout]['Exercise']
+        return pd.Series(self.catalog.exercises_by_workout.get(workout, ()), name='Exercise', dtype=object)
     
     def get_last_workout(self, date, workout, exercise):
-        """Get the last workout for a specific exercise"""
+        """Get the last workout for a specific exercise as a WorkoutEntry"""
+        ids = self._ids(workout, exercise)
+        if ids is None:
+            return None
+
         query = """
-        SELECT History.date, Workouts.name AS workout_name, Exercises.name AS exercise_name, 
-            History.sets, History.reps, History.weight
+        SELECT date, sets, reps, weight
         FROM History
-        JOIN Workouts ON History.workout_id = Workouts.id
-        JOIN Exercises ON History.exercise_id = Exercises.id
-        WHERE History.date < ? AND Workouts.name = ? AND Exercises.name = ? 
-        ORDER BY History.date DESC
+        WHERE exercise_id = ? AND workout_id = ? AND date < ?
+        ORDER BY date DESC
         LIMIT 1;
         """
 
-        data = self.cursor.execute(query, (date, workout, exercise)).fetchall()
-        if len(data) > 0:
-            return pd.DataFrame(data = data, columns=['Date', 'Workout', 'Exercise', 'Sets', 'Reps', 'Weight'])
-        return None
+        day = to_day(date)
+
+        def load():
+            data = self._fetchall(query, (ids[1], ids[0], day))
+            if len(data) > 0:
+                return self._entry(data[0])
+            return None
+
+        return self._cached(('last', day) + ids, [('history',) + ids], load)
     
     def get_current_workout(self, date, workout, exercise):
-        """Get the last workout for a specific exercise"""
+        """Get the workout for a specific exercise on a date as a WorkoutEntry"""
+        ids = self._ids(workout, exercise)
+        if ids is None:
+            return None
+
         query = """
-        SELECT History.date, Workouts.name AS workout_name, Exercises.name AS exercise_name, 
-            History.sets, History.reps, History.weight
+        SELECT date, sets, reps, weight
         FROM History
-        JOIN Workouts ON History.workout_id = Workouts.id
-        JOIN Exercises ON History.exercise_id = Exercises.id
-        WHERE History.date = ? AND Workouts.name = ? AND Exercises.name = ? 
-        ORDER BY History.date DESC
-        LIMIT 1;
+        WHERE date = ? AND workout_id = ? AND exercise_id = ?;
         """
 
-        data = self.cursor.execute(query, (date, workout, exercise)).fetchall()
-        if len(data) > 0:
-            return pd.DataFrame(data = data, columns=['Date', 'Workout', 'Exercise', 'Sets', 'Reps', 'Weight'])
-        return None
-    
+        # A queued write of this entry wins over what is committed
+        day = to_day(date)
+        pending = self._pending_history.get((day,) + ids)
+        if pending is not None:
+            if pending[1] is None:
+                return None
+            return WorkoutEntry(from_day(day), *pending[1][:3])
+
+        def load():
+            data = self._fetchall(query, (day, ids[0], ids[1]))
+            if len(data) > 0:
+                return self._entry(data[0])
+            return None
+
+        return self._cached(('current', day) + ids, [('history',) + ids], load)
+
+    def get_day_snapshot(self, date, workout=None, exercise=None):
+        """Get the last workout, current workout, max and best weight of every exercise for a date
+
+        Pass a workout, an exercise, or both, to only load those.
+        """
+        day = to_day(date)
+        if workout is None and exercise is not None:
+            workout = self.catalog.exercise_workouts.get(exercise)
+            if workout is None:
+                workout = self.refresh_catalog().exercise_workouts.get(exercise)
+            if workout is None:
+                return {}
+        where, params, scope = "1", [day, day], ()
+        if workout is not None:
+            workout_id = self._workout_id(workout)
+            where, params, scope = "Exercises.workout_id = ?", params + [workout_id], (workout_id,)
+            if exercise is not None:
+                exercise_id = self._exercise_id(exercise)
+                where, params, scope = where + " AND Exercises.id = ?", params + [exercise_id], scope + (exercise_id,)
+
+        # One pass over the exercises: the current entry is a direct lookup on the
+        # (date, workout_id, exercise_id) key, the last entry a per-exercise subquery
+        query = f"""
+        SELECT Exercises.workout_id, Exercises.id,
+            Last.date, Last.sets, Last.reps, Last.weight,
+            Current.date, Current.sets, Current.reps, Current.weight,
+            Max.max, ExerciseStats.best_weight
+        FROM Exercises
+        LEFT JOIN History AS Current
+            ON Current.date = ?
+            AND Current.workout_id = Exercises.workout_id
+            AND Current.exercise_id = Exercises.id
+        LEFT JOIN History AS Last ON Last.id = (
+            SELECT History.id
+            FROM History
+            WHERE History.exercise_id = Exercises.id
+            AND History.workout_id = Exercises.workout_id
+            AND History.date < ?
+            ORDER BY History.date DESC
+            LIMIT 1
+        )
+        LEFT JOIN Max
+            ON Max.workout_id = Exercises.workout_id
+            AND Max.exercise_id = Exercises.id
+        LEFT JOIN ExerciseStats
+            ON ExerciseStats.workout_id = Exercises.workout_id
+            AND ExerciseStats.exercise_id = Exercises.id
+        WHERE {where};
+        """
+
+        def load():
+            data = self._fetchall(query, params)
+            names = self.catalog.names
+            if any((row[0], row[1]) not in names for row in data):
+                # Exercises added since the catalog was loaded, e.g. by an import in another process
+                names = self.refresh_catalog().names
+            return {
+                names[(row[0], row[1])]: (self._entry(row[2:6]), self._entry(row[6:10]), row[10], row[11])
+                for row in data
+                if (row[0], row[1]) in names
+            }
+
+        # The rows are cached, the snapshot is built fresh as callers update it in place
+        rows = self._cached(('snapshot', day) + scope, [('history',) + scope, ('max',) + scope], load)
+
+        # Order the snapshot like the catalog
+        keys = self.catalog.exercises
+        if workout is not None:
+            keys = [(workout, name) for name in self.catalog.exercises_by_workout.get(workout, ())]
+        snapshot = {}
+        for key in keys:
+            row = rows.get(key)
+            if row is not None:
+                snapshot[key] = dict(zip(['Last', 'Current', 'Max', 'Best'], row))
+        if self._pending_history or self._pending_max:
+            self._overlay_pending(day, snapshot)
+        return snapshot
+
+    @staticmethod
+    def _entry(values):
+        """Convert a (day, sets, reps, weight) row to a WorkoutEntry, None when the day is"""
+        if values[0] is None:
+            return None
+        return WorkoutEntry(from_day(values[0]), values[1], values[2], values[3])
+
     def save_workout(self, date, workout, exercise, sets, reps, weight):
         """Add new workout entry"""
+        ids = self._ids(workout, exercise)
+        if ids is None:
+            return
+
         # Define the SQL query to insert or update history
         query = """
         INSERT INTO History (date, workout_id, exercise_id, sets, reps, weight)
-        SELECT ?, 
-            Workouts.id, 
-            Exercises.id, 
-            ?, ?, ?
-        FROM Workouts, Exercises
-        WHERE Workouts.name = ? AND Exercises.name = ?
+        VALUES (?, ?, ?, ?, ?, ?)
         ON CONFLICT(date, workout_id, exercise_id) 
         DO UPDATE SET 
             sets = excluded.sets, 
             reps = excluded.reps, 
-            weight = excluded.weight;
+            weight = excluded.weight,
+            volume = NULL;
         """
 
         # Execute the query with the given parameters
-        self.cursor.execute(query, (date, sets, reps, weight, workout, exercise))
-
-        # Commit the transaction
-        self.conn.commit()
+        day = to_day(date)
+        self._execute_write(query, (day, ids[0], ids[1], sets, reps, weight), history=[((day,) + ids, (sets, reps, weight))])
     
     def delete_workout(self, date, workout, exercise):
-        """Add new workout entry"""
-        # Define the SQL query to insert or update history
+        """Delete a workout entry"""
+        ids = self._ids(workout, exercise)
+        if ids is None:
+            return
+
         query = """
         DELETE FROM History 
-        WHERE date = ? 
-        AND workout_id = (SELECT id FROM Workouts WHERE name = ?) 
-        AND exercise_id = (SELECT id FROM Exercises WHERE name = ?);
+        WHERE date = ? AND workout_id = ? AND exercise_id = ?;
         """
 
         # Execute the query with the given parameters
-        self.cursor.execute(query, (date, workout, exercise))
+        day = to_day(date)
+        self._execute_write(query, (day, ids[0], ids[1]), history=[((day,) + ids, None)])
+
+    def save_sets(self, date, workout, exercise, sets):
+        """Save a workout entry set by set, its History row gets their rollup
+
+        sets is a list of WorkoutSet or (reps, weight[, rpe]), an empty list
+        deletes the entry.
+        """
+        batch = WriteBatch()
+        batch.save_sets(date, workout, exercise, sets)
+        return self.apply_batch(batch)
 
-        # Commit the transaction
-        self.conn.commit()
+    def get_sets(self, date, workout, exercise):
+        """Get the sets of a workout entry as a list of WorkoutSet
+
+        An entry that was not logged per set gives its sets x reps x weight as
+        that many equal sets, no entry an empty list.
+        """
+        ids = self._ids(workout, exercise)
+        if ids is None:
+            return []
+
+        query = """
+        SELECT History.sets, History.reps, History.weight, HistorySets.sets
+        FROM History
+        LEFT JOIN HistorySets ON HistorySets.history_id = History.id
+        WHERE History.date = ? AND History.workout_id = ? AND History.exercise_id = ?;
+        """
+
+        day = to_day(date)
+        pending = self._pending_history.get((day,) + ids)
+        if pending is not None:
+            values = pending[1]
+            if values is None:
+                return []
+            return list(values[3]) if len(values) == 4 else [WorkoutSet(values[1], values[2])] * values[0]
+
+        def load():
+            data = self._fetchall(query, (day, ids[0], ids[1]))
+            if len(data) == 0:
+                return ()
+            sets, reps, weight, packed = data[0]
+            if packed is not None:
+                return tuple(unpack_sets(packed))
+            return (WorkoutSet(reps, weight),) * sets
+
+        return list(self._cached(('sets', day) + ids, [('history',) + ids], load))
 
     def get_workout_history(self):
         """Get workout history"""
-        """Get the last workout for a specific exercise"""
+        return self.get_history()
+
+    def get_history(self, workout=None, exercise=None, start=None, end=None, before=None, limit=None, offset=0, ascending=False):
+        """Get workout history filtered by workout, exercise and date range as a DataFrame
+
+        Takes the same filters as get_history_columns.
+        """
+        columns = self.get_history_columns(workout, exercise, start, end, before, limit, offset, ascending)
+        if columns is None:
+            return None
+        return self._frame(columns.to_dict())
+
+    def get_history_columns(self, workout=None, exercise=None, start=None, end=None, before=None, limit=None, offset=0, ascending=False):
+        """Get workout history filtered by workout, exercise and date range as HistoryColumns
+
+        start and end are inclusive. Rows come in date order, ties in workout
+        and exercise id order, so limit and offset pages are stable. For keyset
+        pagination pass the oldest date of the previous page as before, which
+        needs an exercise: only then is a date unique to one row.
+        """
+        if before is not None and exercise is None:
+            raise ValueError("Paging with before needs an exercise, use limit and offset across exercises")
+        start, end, before = [None if value is None else to_day(value) for value in (start, end, before)]
+        conditions, params = [], []
+        if workout is not None:
+            workout_id = self._workout_id(workout)
+            if workout_id is None:
+                return None
+            conditions.append("workout_id = ?")
+            params.append(workout_id)
+        if exercise is not None:
+            exercise_id = self._exercise_id(exercise)
+            if exercise_id is None:
+                return None
+            conditions.append("exercise_id = ?")
+            params.append(exercise_id)
+        if start is not None:
+            conditions.append("date >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("date <= ?")
+            params.append(end)
+        if before is not None:
+            conditions.append("date < ?")
+            params.append(before)
+
+        query = "SELECT date, workout_id, exercise_id, sets, reps, weight, " + VOLUME_SQL.format(row="History") + " FROM History"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        direction = " ASC" if ascending else " DESC"
+        query += " ORDER BY date" + direction
+        # An exercise has one row per date, else ties are ordered like the UNIQUE index
+        if exercise is None:
+            query += ", workout_id" + direction + ", exercise_id" + direction
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+
+        def load():
+            data = self._fetchall(query, params)
+            if len(data) > 0:
+                # Ids are translated to names in the columns instead of joining per row
+                columns = HistoryColumns(data, self.catalog)
+                if None in columns.workouts or None in columns.exercises:
+                    # Rows of exercises added since the catalog was loaded, e.g. by an import in another process
+                    columns = HistoryColumns(data, self.refresh_catalog())
+                return columns
+            return None
+
+        # A filter on the exercise alone can match any workout
+        scope = ('history',)
+        if workout is not None:
+            scope += (workout_id,) + ((exercise_id,) if exercise is not None else ())
+        key = ('history', workout, exercise, start, end, before, limit, offset, ascending)
+        return self._cached(key, [scope], load)
+
+    def get_history_between(self, start, end, workout=None, exercise=None):
+        """Get the history from start to end, both inclusive, oldest first as HistoryColumns"""
+        return self.get_history_columns(workout, exercise, start=start, end=end, ascending=True)
+
+    def get_history_last_weeks(self, weeks, workout=None, exercise=None, today=None):
+        """Get the history of this Monday to Sunday week and the weeks - 1 before it as HistoryColumns"""
+        today = to_day(today if today is not None else datetime.now().date())
+        start = ((today + 3) // 7 - weeks + 1) * 7 - 3
+        return self.get_history_columns(workout, exercise, start=start, ascending=True)
+
+    def get_history_buckets(self, period='week', workout=None, exercise=None, start=None, end=None):
+        """Get a HistoryBucket per exercise per Monday to Sunday week or calendar month, oldest first
+
+        SQLite groups the day numbers itself, the date range is an index seek.
+        """
+        if period not in ('week', 'month'):
+            raise ValueError(f"Unknown period '{period}', use 'week' or 'month'")
+
+        conditions, params, scope = [], [], ('history',)
+        if workout is not None:
+            workout_id = self._workout_id(workout)
+            if workout_id is None:
+                return []
+            conditions.append("workout_id = ?")
+            params.append(workout_id)
+            scope += (workout_id,)
+            if exercise is not None:
+                exercise_id = self._exercise_id(exercise)
+                if exercise_id is None:
+                    return []
+                conditions.append("exercise_id = ?")
+                params.append(exercise_id)
+                scope += (exercise_id,)
+        if start is not None:
+            conditions.append("date >= ?")
+            params.append(to_day(start))
+        if end is not None:
+            conditions.append("date <= ?")
+            params.append(to_day(end))
+
+        bucket_sql, bucket_start = (WEEK_SQL, week_start) if period == 'week' else (MONTH_SQL, month_start)
+        query = BUCKETS_SQL.format(
+            bucket=bucket_sql.format(column="date"),
+            where="WHERE " + " AND ".join(conditions) if conditions else ""
+        )
+
+        def load():
+            data = self._fetchall(query, params)
+            catalog = self.catalog
+            if any(row[1] not in catalog.workout_names or row[2] not in catalog.exercise_names for row in data):
+                catalog = self.refresh_catalog()
+            # Every exercise of a period shares its start date
+            starts = {}
+            buckets = []
+            for bucket, workout_id, exercise_id, sessions, volume, best_weight in data:
+                start = starts.get(bucket)
+                if start is None:
+                    start = starts[bucket] = bucket_start(bucket)
+                buckets.append(HistoryBucket(start, catalog.workout_names.get(workout_id), catalog.exercise_names.get(exercise_id),
+                                             sessions, volume, best_weight))
+            return tuple(buckets)
+
+        key = ('buckets', period, workout, exercise) + tuple(params)
+        return list(self._cached(key, [scope], load))
+
+    def get_history_exercises(self):
+        """Get the (workout, exercise) pairs that have history, in catalog order"""
+        # One index seek per exercise instead of reading History
         query = """
-        SELECT History.date, Workouts.name AS workout_name, Exercises.name AS exercise_name, 
-            History.sets, History.reps, History.weight
-        FROM History
-        JOIN Workouts ON History.workout_id = Workouts.id
-        JOIN Exercises ON History.exercise_id = Exercises.id
-        ORDER BY History.date DESC;
+        SELECT workout_id, id
+        FROM Exercises
+        WHERE EXISTS (
+            SELECT 1 FROM History
+            WHERE History.exercise_id = Exercises.id
+            AND History.workout_id = Exercises.workout_id
+        );
         """
 
-        data = self.cursor.execute(query).fetchall()
-        if len(data) > 0:
-            return pd.DataFrame(data = data, columns=['Date', 'Workout', 'Exercise', 'Sets', 'Reps', 'Weight'])
-        return None
+        def load():
+            data = self._fetchall(query)
+            catalog = self.catalog
+            if any(ids not in catalog.names for ids in data):
+                catalog = self.refresh_catalog()
+            with_history = set(catalog.names.get(ids) for ids in data)
+            return tuple(key for key in catalog.exercises if key in with_history)
+
+        return list(self._cached(('history_exercises',), [('history',)], load))
 
     def get_max(self, workout, exercise):
         """Get the max weight for an exercise"""
+        ids = self._ids(workout, exercise)
+        if ids is None:
+            return None
+
         query = """
         SELECT max
         FROM Max
-        JOIN Workouts ON Max.workout_id = Workouts.id
-        JOIN Exercises ON Max.exercise_id = Exercises.id
-        WHERE Workouts.name = ? AND Exercises.name = ?
+        WHERE workout_id = ? AND exercise_id = ?
+        """
+
+        pending = self._pending_max.get(ids)
+        if pending is not None:
+            return pending[1]
+
+        def load():
+            data = self._fetchall(query, ids)
+            if len(data) > 0:
+                return data[0][0]
+            return None
+
+        return self._cached(('max',) + ids, [('max',) + ids], load)
+    
+    def get_exercise_stats(self, workout, exercise):
+        """Get the precomputed progress and record aggregates of an exercise"""
+        ids = self._ids(workout, exercise)
+        if ids is None:
+            return None
+
+        query = """
+        SELECT first_date, first_weight, last_date, last_weight,
+            best_weight, best_e1rm, sessions, volume
+        FROM ExerciseStats
+        WHERE workout_id = ? AND exercise_id = ?
         """
 
-        data = self.cursor.execute(query, (workout, exercise)).fetchall()
+        data = self._cached(('stats',) + ids, [('history',) + ids], lambda: self._fetchall(query, ids))
         if len(data) > 0:
-            return data[0][0]
+            stats = dict(zip(['FirstDate', 'FirstWeight', 'LastDate', 'LastWeight',
+                              'BestWeight', 'BestE1RM', 'Sessions', 'Volume'], data[0]))
+            stats['FirstDate'] = from_day(stats['FirstDate'])
+            stats['LastDate'] = from_day(stats['LastDate'])
+            return stats
         return None
     
+    def get_exercise_revision(self, workout, exercise):
+        """Get a number that changes whenever the history of an exercise changes"""
+        ids = self._ids(workout, exercise)
+        if ids is None:
+            return None
+
+        query = "SELECT revision FROM ExerciseRevisions WHERE workout_id = ? AND exercise_id = ?"
+        data = self._cached(('revision',) + ids, [('history',) + ids], lambda: self._fetchall(query, ids))
+        if len(data) > 0:
+            return data[0][0]
+        return 0
+
     def save_max(self, workout, exercise, max_weight):
         """Save the max weight for an exercise"""
+        ids = self._ids(workout, exercise)
+        if ids is None:
+            return
+
         query = """
         INSERT INTO Max (workout_id, exercise_id, max)
-        SELECT Workouts.id, Exercises.id, ?
-        FROM Workouts, Exercises
-        WHERE Workouts.name = ? AND Exercises.name = ?
+        VALUES (?, ?, ?)
         ON CONFLICT(workout_id, exercise_id) 
         DO UPDATE SET 
-            max = ?;
+            max = excluded.max;
         """
 
         # Execute the query with the given parameters
-        self.cursor.execute(query, (max_weight, workout, exercise, max_weight))
+        self._execute_write(query, (ids[0], ids[1], max_weight), maxes=[(ids, max_weight)])
+
+    @contextmanager
+    def batch(self):
+        """Collect writes in a WriteBatch and apply them together on exit"""
+        batch = WriteBatch()
+        yield batch
+        batch.changes = self.apply_batch(batch)
+
+    def save_many(self, entries):
+        """Save many (date, workout, exercise, sets, reps, weight) entries at once"""
+        batch = WriteBatch()
+        for entry in entries:
+            batch.save_workout(*entry)
+        return self.apply_batch(batch)
+
+    def apply_batch(self, batch):
+        """Apply all writes of a batch in one transaction, returns the rows changed
+
+        In write-behind mode the batch is queued and None is returned.
+        """
+        if len(batch) == 0:
+            return 0
+
+        upserts, deletes, rollups, packed, maxes = [], [], [], [], []
+        history = []
+        for (day, workout, exercise), values in batch.workouts.items():
+            # Unknown names are skipped, like the single row writes do
+            ids = self._ids(workout, exercise)
+            if ids is None:
+                continue
+            history.append(((day,) + ids, values))
+            if values is None:
+                deletes.append((day,) + ids)
+            elif len(values) == 4:
+                rollups.append((day,) + ids + values[:3] + rollup_sets(values[3])[3:])
+                packed.append((pack_sets(values[3]), day) + ids)
+            else:
+                upserts.append((day,) + ids + tuple(values))
+        for (workout, exercise), max_weight in batch.maxes.items():
+            ids = self._ids(workout, exercise)
+            if ids is None:
+                continue
+            maxes.append(ids + (max_weight,))
+
+        rerun = self._rerun()
+
+        def write(conn):
+            # rowcount leaves out the rows the stats triggers touch
+            changes = 0
+            for query, rows in [(BATCH_DELETE_SQL, deletes), (BATCH_UPSERT_SQL, upserts), (BATCH_ROLLUP_UPSERT_SQL, rollups),
+                                (BATCH_SETS_SQL, packed), (BATCH_MAX_SQL, maxes)]:
+                start = time.perf_counter()
+                count = conn.executemany(query, rows).rowcount
+                if rerun is not None:
+                    self.tracer.record_query(rerun, query, time.perf_counter() - start, count)
+                changes += count
+            return changes
+
+        # One job, so the whole batch commits or rolls back together
+        return self._submit_write(write, history, [(entry[:2], entry[2]) for entry in maxes])
+
+    def add_exercises(self, workouts_exercises):
+        """Create the workouts and exercises of (workout, exercise) pairs that don't exist yet
+
+        Exercise names are unique, so a pair naming a known exercise under another
+        workout, or one already paired earlier in the list, is left out. Returns
+        the number of exercises created.
+        """
+        catalog = self.refresh_catalog()
+        # exercise -> workout, the first pair of an exercise wins
+        added = {}
+        for workout, exercise in workouts_exercises:
+            if exercise not in catalog.exercise_ids and exercise not in added:
+                added[exercise] = workout
+        missing = [(workout, exercise) for exercise, workout in added.items()]
+        if not missing:
+            return 0
+
+        def write(conn):
+            conn.executemany("INSERT OR IGNORE INTO Workouts (name) VALUES (?)", [(workout,) for workout, _ in missing])
+            conn.executemany("""
+            INSERT OR IGNORE INTO Exercises (workout_id, name)
+            SELECT id, ? FROM Workouts WHERE name = ?
+            """, [(exercise, workout) for workout, exercise in missing])
+            conn.execute("""
+            INSERT OR IGNORE INTO Max (workout_id, exercise_id, max)
+            SELECT workout_id, id, 0 FROM Exercises
+            """)
+
+        self._pool.write(write)
+        self._invalidate_catalog()
+        return len(missing)
+
+    def import_history(self, path, chunk_size=5000):
+        """Upsert the history of a CSV or Parquet file, returns an ImportResult
+
+        The file is read chunk_size rows at a time and every chunk is written
+        in its own transaction, so memory stays bounded for any file size. Rows
+        of an exercise that belongs to another workout are skipped and counted.
+        Rows with a set list get their sets back, rolled up like save_sets does.
+        """
+        rows = skipped = 0
+        writing = None
+        try:
+            for chunk in read_history_chunks(path, chunk_size):
+                self.add_exercises((workout, exercise) for _, workout, exercise, _, _, _, _ in chunk)
+                catalog = self.catalog
+                # Keyed like the rows, so the last row of an entry in the chunk wins
+                entries = {}
+                skipped_before = skipped
+                for date, workout, exercise, sets, reps, weight, set_list in chunk:
+                    ids = catalog.ids(workout, exercise)
+                    if ids is None:
+                        skipped += 1
+                        continue
+                    entries[(to_day(date),) + ids] = (sets, reps, weight, set_list)
+                chunk_rows = len(chunk) - (skipped - skipped_before)
+
+                upserts, rollups, packed = [], [], []
+                for key, (sets, reps, weight, set_list) in entries.items():
+                    if set_list is None:
+                        upserts.append(key + (sets, reps, weight))
+                        continue
+                    # Round trip so the rollup is made of the values as stored
+                    packed_sets = pack_sets(set_list)
+                    rollups.append(key + rollup_sets(unpack_sets(packed_sets)))
+                    packed.append((packed_sets,) + key)
+
+                def write(conn, upserts=upserts, rollups=rollups, packed=packed, chunk_rows=chunk_rows):
+                    conn.executemany(BATCH_UPSERT_SQL, upserts)
+                    conn.executemany(BATCH_ROLLUP_UPSERT_SQL, rollups)
+                    conn.executemany(BATCH_SETS_SQL, packed)
+                    # Every row of the file that was not skipped, repeats of an entry included
+                    return chunk_rows
+
+                # The next chunk is parsed while this one is written, at most one
+                # chunk is queued so the memory stays bounded
+                if writing is not None:
+                    rows += writing.result()
+                writing = self._pool.submit(write)
+            if writing is not None:
+                rows += writing.result()
+                writing = None
+        finally:
+            # A failed import keeps the chunks committed before it, so the cached
+            # reads go either way. The chunk still being written is waited for
+            # first, a read in between would cache the rows from before it.
+            if writing is not None:
+                writing.exception()
+            if self._cache is not None:
+                self._cache.clear()
+        return ImportResult(rows, skipped)
+
+    def export_history(self, path, chunk_size=5000):
+        """Write all history to a CSV or Parquet file, returns the rows exported
+
+        Entries logged per set are written with their set list, so importing
+        the file restores the sets and the exact volume.
+        """
+        query = """
+        SELECT History.date, History.workout_id, History.exercise_id, History.sets, History.reps, History.weight, HistorySets.sets
+        FROM History
+        LEFT JOIN HistorySets ON HistorySets.history_id = History.id
+        ORDER BY History.date, History.workout_id, History.exercise_id
+        """
+
+        def chunks(conn):
+            catalog = self.catalog
+            cursor = conn.execute(query)
+            while True:
+                data = cursor.fetchmany(chunk_size)
+                if not data:
+                    return
+                if any(row[1] not in catalog.workout_names or row[2] not in catalog.exercise_names for row in data):
+                    catalog = self.refresh_catalog()
+                yield [
+                    (from_day(day), catalog.workout_names.get(workout_id), catalog.exercise_names.get(exercise_id), sets, reps, weight,
+                     unpack_sets(packed) if packed is not None else None)
+                    for day, workout_id, exercise_id, sets, reps, weight, packed in data
+                ]
 
-        # Commit the transaction
-        self.conn.commit()
-    
\ No newline at end of file
+        with self._pool.reader() as conn:
+            return write_history_chunks(path, chunks(conn))
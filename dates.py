@@ -0,0 +1,52 @@
+from datetime import date, datetime
+
+# History stores a date as its day number, the days since 1970-01-01
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# 1970-01-01 was a Thursday, so (day + 3) // 7 numbers the Monday to Sunday weeks
+WEEK_SQL = "(({column} + 3) / 7)"
+# Months are numbered year * 12 + month - 1, SQLite reads a day number plus the
+# Julian day of 1970-01-01 as a date
+MONTH_SQL = "(CAST(strftime('%Y', {column} + 2440587.5) AS INTEGER) * 12 + CAST(strftime('%m', {column} + 2440587.5) AS INTEGER) - 1)"
+
+# Date formats accepted besides ISO, the app shows dates as DD/MM/YYYY
+DATE_FORMATS = ['%d/%m/%Y']
+
+def parse_date(value):
+    """Get a date from a date, datetime or date string"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = str(value).strip()
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognized date '{value}'")
+
+def to_day(value):
+    """Get the day number of a date, datetime, date string or day number"""
+    if isinstance(value, int):
+        return value
+    return parse_date(value).toordinal() - EPOCH_ORDINAL
+
+def from_day(day):
+    """Get the date of a day number, None stays None"""
+    if day is None:
+        return None
+    return date.fromordinal(day + EPOCH_ORDINAL)
+
+def week_start(week):
+    """Get the Monday of a week numbered like WEEK_SQL"""
+    return from_day(week * 7 - 3)
+
+def month_start(month):
+    """Get the first day of a month numbered like MONTH_SQL"""
+    year, month = divmod(month, 12)
+    return date(year, month + 1, 1)
@@ -0,0 +1,126 @@
+import argparse
+import csv
+import os
+from dates import parse_date
+from workout_sets import format_sets, parse_sets
+
+COLUMNS = ['Date', 'Workout', 'Exercise', 'Sets', 'Reps', 'Weight']
+
+# Optional, the sets of entries logged per set as written by format_sets, empty for the others
+SET_LIST_COLUMN = 'SetList'
+
+def file_format(path):
+    """Get 'csv' or 'parquet' from a file name"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.parquet', '.pq'):
+        return 'parquet'
+    raise ValueError(f"Unsupported history file '{path}', use .csv or .parquet")
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet import and export need pyarrow, install it with 'pip install pyarrow'")
+    return pyarrow
+
+def _entry(date_value, workout, exercise, sets, reps, weight, set_list=None):
+    return (parse_date(date_value), str(workout), str(exercise), int(sets), int(reps), float(weight),
+            parse_sets(set_list) if set_list else None)
+
+def read_history_chunks(path, chunk_size=5000):
+    """Yield lists of (date, workout, exercise, sets, reps, weight, set list) of at most chunk_size
+
+    The set list is a list of WorkoutSet, None for entries that were not logged per set.
+    """
+    if file_format(path) == 'csv':
+        with open(path, newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            header = [name.strip().lower() for name in next(reader)]
+            positions = [header.index(column.lower()) for column in COLUMNS]
+            if SET_LIST_COLUMN.lower() in header:
+                positions.append(header.index(SET_LIST_COLUMN.lower()))
+            chunk = []
+            for row in reader:
+                if not row:
+                    continue
+                chunk.append(_entry(*[row[position] for position in positions]))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        return
+
+    pyarrow = _import_pyarrow()
+    parquet = pyarrow.parquet.ParquetFile(path)
+    names = {name.lower(): name for name in parquet.schema_arrow.names}
+    columns = [names[column.lower()] for column in COLUMNS + [SET_LIST_COLUMN] if column.lower() in names]
+    if len(columns) < len(COLUMNS):
+        raise ValueError(f"'{path}' needs the columns {', '.join(COLUMNS)}")
+    for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+        yield [_entry(*values) for values in zip(*(batch.column(i).to_pylist() for i in range(len(columns))))]
+
+def write_history_chunks(path, chunks):
+    """Write chunks of (date, workout, exercise, sets, reps, weight, set list) rows, returns the row count
+
+    The set list is a list of WorkoutSet or None, written to SET_LIST_COLUMN.
+    """
+    rows = 0
+    if file_format(path) == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(COLUMNS + [SET_LIST_COLUMN])
+            for chunk in chunks:
+                writer.writerows(row[:6] + (format_sets(row[6]) if row[6] else '',) for row in chunk)
+                rows += len(chunk)
+        return rows
+
+    pyarrow = _import_pyarrow()
+    schema = pyarrow.schema([
+        ('Date', pyarrow.date32()),
+        ('Workout', pyarrow.string()),
+        ('Exercise', pyarrow.string()),
+        ('Sets', pyarrow.int32()),
+        ('Reps', pyarrow.int32()),
+        ('Weight', pyarrow.float64()),
+        (SET_LIST_COLUMN, pyarrow.string())
+    ])
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            columns = list(zip(*chunk))
+            columns[0] = [parse_date(value) for value in columns[0]]
+            columns[6] = [format_sets(value) if value else None for value in columns[6]]
+            writer.write_batch(pyarrow.record_batch([pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+            rows += len(chunk)
+    return rows
+
+def main(argv=None):
+    from data_handler import DataHandler
+
+    parser = argparse.ArgumentParser(description="Import or export workout history as CSV or Parquet")
+    parser.add_argument('action', choices=['import', 'export'])
+    parser.add_argument('path', help="a .csv or .parquet file")
+    parser.add_argument('--db', default='data/data.db', help="the tracker database")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="rows per transaction or read")
+    args = parser.parse_args(argv)
+
+    data_handler = DataHandler(args.db)
+    try:
+        if args.action == 'import':
+            result = data_handler.import_history(args.path, args.chunk_size)
+            print(f"Imported {result.rows} rows from {args.path}")
+            if result.skipped:
+                print(f"Skipped {result.skipped} rows of exercises that belong to another workout")
+        else:
+            rows = data_handler.export_history(args.path, args.chunk_size)
+            print(f"Exported {rows} rows to {args.path}")
+    finally:
+        data_handler.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
+import os
 import streamlit as st
 from data_handler import DataHandler
-from components import render_workout_form, render_history_view
+from tracing import QueryTracer
+from components import render_workout_form, render_history_view, render_debug_panel
 from utils import initialize_session_state
 
 # Page config
@@ -10,26 +12,57 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize data handler
-data_handler = DataHandler()
+# Initialize data handler once per process and share it between sessions
+@st.cache_resource
+def get_data_handler():
+    # The tracer only times reruns started on it, so it costs nothing until used.
+    # GYM_WRITE_BEHIND=1 lets saves return before their commit.
+    return DataHandler(
+        tracer=QueryTracer(export_path=os.environ.get("GYM_TRACE_FILE")),
+        write_behind=os.environ.get("GYM_WRITE_BEHIND") == "1"
+    )
 
-# Initialize session state
-initialize_session_state()
+data_handler = get_data_handler()
 
-# Main title
-st.title("💪 Gym Exercise Tracker")
+# GYM_API_PORT also serves the HTTP/JSON API from this process, on the same handler
+@st.cache_resource
+def start_api(port):
+    from api import serve_in_background
+    return serve_in_background(data_handler, port=port)
 
+if os.environ.get("GYM_API_PORT"):
+    start_api(int(os.environ["GYM_API_PORT"]))
 
-# Sidebar navigation
-page = st.sidebar.radio("Navigation", ["Daily Workout", "Exercise History"])
+# Opt-in query tracing of this rerun, open the app with ?debug=1
+debug = st.query_params.get("debug") == "1"
+if debug:
+    data_handler.tracer.start_rerun()
 
-if page == "Daily Workout":
-    # Render workout form
-    render_workout_form(data_handler)
+# The trace is ended however the rerun stops, st.rerun() and errors included,
+# or the thread Streamlit reuses for later reruns would keep recording into it
+try:
+    # Initialize session state
+    initialize_session_state()
 
-elif page == "Exercise History":
-    render_history_view(data_handler)
+    # Main title
+    st.title("💪 Gym Exercise Tracker")
 
-# Footer
-st.markdown("---")
-st.markdown("Built by Sven -- With the help of AI 💪")
\ No newline at end of file
+
+    # Sidebar navigation
+    page = st.sidebar.radio("Navigation", ["Daily Workout", "Exercise History"])
+
+    if page == "Daily Workout":
+        # Render workout form
+        render_workout_form(data_handler)
+
+    elif page == "Exercise History":
+        render_history_view(data_handler)
+
+    # Footer
+    st.markdown("---")
+    st.markdown("Built by Sven -- With the help of AI 💪")
+finally:
+    rerun = data_handler.tracer.end_rerun() if debug else None
+
+if debug:
+    render_debug_panel(data_handler.tracer, rerun, data_handler.cache_stats())
@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+
+class QueryCache:
+    """Bounded LRU cache of read results, invalidated by per-scope write counters
+
+    A value is cached with the counters of the scopes it was read from, e.g.
+    ('history', workout_id, exercise_id). Writes bump the counters of the
+    scopes they touch, so afterwards only the values read from those miss.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (scopes, versions, value), least recently used first
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _current(self, scopes):
+        return (self._generation,) + tuple(self._versions.get(scope, 0) for scope in scopes)
+
+    def get_or_load(self, key, scopes, load):
+        """Get the cached value of key, else call load() and cache what it returns"""
+        with self._lock:
+            entry = self._entries.get(key)
+            versions = self._current(scopes)
+            if entry is not None and entry[1] == versions:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        # Read outside the lock, the counters were taken first so a write that
+        # lands meanwhile leaves this value stale instead of wrongly valid
+        value = load()
+        with self._lock:
+            self._entries[key] = (scopes, versions, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, scopes):
+        """Make every value read from one of scopes miss, call once the write is committed"""
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def clear(self):
+        """Drop everything, for writes that cannot name what they touched"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Get the hit, miss and eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'hit_rate': self.hits / lookups if lookups else None
+            }
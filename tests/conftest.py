@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_handler import DataHandler
+
+@pytest.fixture
+def data_handler(tmp_path):
+    """A DataHandler on a new seeded database"""
+    data_handler = DataHandler(str(tmp_path / 'data.db'))
+    yield data_handler
+    data_handler.close()
@@ -0,0 +1,100 @@
+import pytest
+
+from api import ApiClient, serve_in_background
+
+@pytest.fixture
+def client(data_handler):
+    """An ApiClient of a server on the data_handler fixture"""
+    server = serve_in_background(data_handler, port=0)
+    client = ApiClient(port=server.server_address[1])
+    yield client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+def post_entry(client, **entry):
+    return client.request('POST', '/days/2024-01-05', body={'entries': [dict({'workout': 'Push', 'exercise': 'Bench'}, **entry)]})
+
+def test_save_and_read_a_day(client):
+    result = client.save_day('05/01/2024', entries=[{'workout': 'Push', 'exercise': 'Bench', 'sets': 3, 'reps': 8, 'weight': 60}],
+                             maxes=[{'workout': 'Push', 'exercise': 'Bench', 'max': 80}])
+    assert result == {'date': '2024-01-05', 'changes': 2}
+
+    day = client.day('2024-01-05', 'Push', 'Bench')
+    assert day['exercises'] == [{
+        'workout': 'Push',
+        'exercise': 'Bench',
+        'last': None,
+        'current': {'date': '2024-01-05', 'sets': 3, 'reps': 8, 'weight': 60.0},
+        'max': 80,
+        'best': 60.0
+    }]
+    assert client.history('Push', 'Bench') == [
+        {'date': '2024-01-05', 'workout': 'Push', 'exercise': 'Bench', 'sets': 3, 'reps': 8, 'weight': 60.0, 'volume': 1440.0}
+    ]
+    assert client.buckets('month', 'Push', 'Bench')[0]['start'] == '2024-01-01'
+
+def test_save_and_read_sets(client):
+    sets = [{'reps': 8, 'weight': 60, 'rpe': 8}, {'reps': 12, 'weight': 40}]
+    client.save_day('2024-01-05', entries=[{'workout': 'Push', 'exercise': 'Bench', 'sets': sets}])
+    assert client.sets('2024-01-05', 'Push', 'Bench') == [{'reps': 8, 'weight': 60.0, 'rpe': 8.0}, {'reps': 12, 'weight': 40.0, 'rpe': None}]
+    assert client.day('2024-01-05', 'Push', 'Bench')['exercises'][0]['current'] == {'date': '2024-01-05', 'sets': 2, 'reps': 8, 'weight': 60.0}
+
+@pytest.mark.parametrize('entry', [
+    {'workout': 'Pull', 'sets': 3, 'reps': 8, 'weight': 60},
+    {'workout': ['Push'], 'sets': 3, 'reps': 8, 'weight': 60},
+    {'exercise': None, 'sets': 3, 'reps': 8, 'weight': 60},
+    {'exercise': 'Nope', 'sets': 3, 'reps': 8, 'weight': 60},
+    {'sets': 0, 'reps': 8, 'weight': 60},
+    {'sets': True, 'reps': 8, 'weight': 60},
+    {'sets': 2.5, 'reps': 8, 'weight': 60},
+    {'sets': float('inf'), 'reps': 8, 'weight': 60},
+    {'sets': 3, 'reps': 8, 'weight': float('nan')},
+    {'sets': 3, 'reps': 8, 'weight': -1},
+    {'sets': 10 ** 30, 'reps': 8, 'weight': 60},
+    {'sets': 3, 'reps': 10 ** 30, 'weight': 60},
+    {'sets': 3, 'reps': 8, 'weight': 10 ** 400},
+    {'sets': []},
+    {'sets': ['x']},
+    {'sets': [{'reps': 8}]},
+    {'sets': [{'reps': 8, 'weight': 60, 'rpe': 11}]},
+    {'sets': [{'reps': 70000, 'weight': 60}]},
+    {'sets': [{'reps': 8, 'weight': 1e12}]},
+    {'sets': [{'reps': 8, 'weight': 10 ** 400}]},
+])
+def test_invalid_entries_are_refused(client, entry):
+    status, payload = post_entry(client, **entry)
+    assert status == 400, payload
+    # Nothing of the day was written
+    assert client.day('2024-01-05', 'Push', 'Bench')['exercises'][0]['current'] is None
+
+@pytest.mark.parametrize('method, path, params, body, status', [
+    ('GET', '/nope', None, None, 404),
+    ('POST', '/exercises', None, {}, 404),
+    ('GET', '/days/notadate', None, None, 400),
+    ('POST', '/days/2024-01-05', None, [1], 400),
+    ('POST', '/days/2024-01-05', None, {'entries': ['x']}, 400),
+    ('POST', '/days/2024-01-05', None, {'entries': 5}, 400),
+    ('POST', '/days/2024-01-05', None, {'deletes': {'workout': 'Push', 'exercise': 'Bench'}}, 400),
+    ('POST', '/days/2024-01-05', None, {'maxes': 'Bench'}, 400),
+    ('GET', '/days/2024-01-05/sets', {'workout': 'Pull', 'exercise': 'Bench'}, None, 400),
+    ('GET', '/history', {'order': 'up'}, None, 400),
+    ('GET', '/history', {'limit': 'ten'}, None, 400),
+    ('GET', '/history/buckets', {'period': 'year'}, None, 400),
+])
+def test_bad_requests(client, method, path, params, body, status):
+    assert client.request(method, path, params, body)[0] == status
+    # The keep-alive connection is still usable
+    assert 'Push' in client.exercises()
+
+def test_invalid_json(client):
+    client.connection.request('POST', '/days/2024-01-05', body=b'{bad', headers={'Content-Type': 'application/json'})
+    response = client.connection.getresponse()
+    assert response.status == 400
+    response.read()
+    assert 'Push' in client.exercises()
+
+def test_day_of_an_exercise_alone(client):
+    day = client.day('2024-01-05', exercise='Bench')
+    assert [(entry['workout'], entry['exercise']) for entry in day['exercises']] == [('Push', 'Bench')]
+    assert client.day('2024-01-05', exercise='Nope')['exercises'] == []
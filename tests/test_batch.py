@@ -0,0 +1,45 @@
+import sqlite3
+
+import pytest
+
+def day_weights(data_handler, day='2024-01-05'):
+    return {
+        exercise: entry['Current'].weight
+        for (_, exercise), entry in data_handler.get_day_snapshot(day, 'Push').items()
+        if entry['Current'] is not None
+    }
+
+def test_batch_changes_are_counted(data_handler):
+    data_handler.save_workout('2024-01-05', 'Push', 'Shoulder', 3, 10, 20)
+    with data_handler.batch() as batch:
+        batch.delete_workout('2024-01-05', 'Push', 'Shoulder')
+        batch.save_workout('2024-01-05', 'Push', 'Bench', 3, 8, 60)
+        batch.save_sets('2024-01-05', 'Push', 'Triceps', [(12, 15), (10, 17.5)])
+        batch.save_max('Push', 'Bench', 80)
+        # Unknown names are skipped
+        batch.save_workout('2024-01-05', 'Push', 'Nope', 3, 8, 60)
+    # The delete, two upserts, the packed sets and the max
+    assert batch.changes == 5
+    assert day_weights(data_handler) == {'Bench': 60, 'Triceps': 17.5}
+    assert data_handler.get_max('Push', 'Bench') == 80
+
+def test_a_failing_row_rolls_back_the_batch(data_handler):
+    data_handler.save_workout('2024-01-05', 'Push', 'Shoulder', 3, 10, 20)
+    with pytest.raises(sqlite3.IntegrityError):
+        with data_handler.batch() as batch:
+            batch.delete_workout('2024-01-05', 'Push', 'Shoulder')
+            batch.save_workout('2024-01-05', 'Push', 'Bench', 3, 8, 60)
+            batch.save_max('Push', 'Bench', 80)
+            # sets is NOT NULL
+            batch.save_workout('2024-01-05', 'Push', 'Triceps', None, 8, 60)
+
+    assert day_weights(data_handler) == {'Shoulder': 20}
+    assert data_handler.get_max('Push', 'Bench') == 0
+    assert data_handler.get_exercise_stats('Push', 'Bench') is None
+
+def test_an_error_in_the_block_writes_nothing(data_handler):
+    with pytest.raises(RuntimeError):
+        with data_handler.batch() as batch:
+            batch.save_workout('2024-01-05', 'Push', 'Bench', 3, 8, 60)
+            raise RuntimeError
+    assert day_weights(data_handler) == {}
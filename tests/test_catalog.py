@@ -0,0 +1,33 @@
+import data_handler as data_handler_module
+from data_handler import DataHandler
+
+def add_arms_curl(tmp_path):
+    """Log Arms/Curl through another handler, like an import in another process"""
+    other = DataHandler(str(tmp_path / 'data.db'))
+    try:
+        other.add_exercises([('Arms', 'Curl')])
+        other.save_workout('2024-01-05', 'Arms', 'Curl', 3, 10, 12.5)
+    finally:
+        other.close()
+
+def test_reads_find_exercises_added_by_another_handler(data_handler, tmp_path):
+    assert 'Arms' not in data_handler.catalog.workouts
+    add_arms_curl(tmp_path)
+
+    assert ('Arms', 'Curl') in data_handler.get_history_exercises()
+    history = data_handler.get_history()
+    assert list(history['Workout']) == ['Arms'] and list(history['Exercise']) == ['Curl']
+    assert ('Arms', 'Curl') in data_handler.get_day_snapshot('2024-01-05')
+    assert data_handler.get_current_workout('2024-01-05', 'Arms', 'Curl').weight == 12.5
+
+def test_catalog_is_checked_for_changes(data_handler, tmp_path, monkeypatch):
+    catalog = data_handler.catalog
+    add_arms_curl(tmp_path)
+    # Within CATALOG_CHECK_SECONDS the loaded catalog is used as is
+    assert data_handler.catalog is catalog
+
+    monkeypatch.setattr(data_handler_module, 'CATALOG_CHECK_SECONDS', 0)
+    assert list(data_handler.get_exercises_by_workout('Arms')) == ['Curl']
+    # Unchanged, it is kept
+    catalog = data_handler.catalog
+    assert data_handler.catalog is catalog
@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from data_handler import VOLUME_SQL
+
+def stats_rows(data_handler):
+    with data_handler._pool.reader() as conn:
+        return conn.execute("""
+        SELECT workout_id, exercise_id, first_date, first_weight, last_date, last_weight,
+            best_weight, best_e1rm, sessions, volume
+        FROM ExerciseStats ORDER BY workout_id, exercise_id
+        """).fetchall()
+
+def recomputed_stats(data_handler):
+    """ExerciseStats worked out in Python from the History rows"""
+    with data_handler._pool.reader() as conn:
+        rows = conn.execute(
+            "SELECT workout_id, exercise_id, date, reps, weight, " + VOLUME_SQL.format(row="History") + " FROM History"
+        ).fetchall()
+    by_exercise = {}
+    for workout_id, exercise_id, day, reps, weight, volume in rows:
+        by_exercise.setdefault((workout_id, exercise_id), []).append((day, reps, weight, volume))
+    stats = []
+    for ids, entries in sorted(by_exercise.items()):
+        entries.sort()
+        stats.append(ids + (
+            entries[0][0], entries[0][2], entries[-1][0], entries[-1][2],
+            max(weight for _, _, weight, _ in entries),
+            pytest.approx(max(weight if reps <= 1 else weight * (1 + reps / 30.0) for _, reps, weight, _ in entries)),
+            len(entries),
+            pytest.approx(sum(volume for _, _, _, volume in entries))
+        ))
+    return stats
+
+def test_stats_match_a_recompute_after_random_writes(data_handler):
+    rng = random.Random(7)
+    exercises = [('Push', 'Bench'), ('Push', 'Shoulder'), ('Pull', 'Row'), ('Legs', 'Kuiten')]
+    for step in range(300):
+        workout, exercise = rng.choice(exercises)
+        day = f'2024-03-{rng.randint(1, 20):02d}'
+        action = rng.random()
+        if action < 0.4:
+            data_handler.save_workout(day, workout, exercise, rng.randint(1, 5), rng.randint(1, 12), rng.randint(10, 100) / 2)
+        elif action < 0.6:
+            data_handler.save_sets(day, workout, exercise, [(rng.randint(1, 12), rng.randint(10, 100) / 2) for _ in range(rng.randint(1, 4))])
+        elif action < 0.85:
+            data_handler.delete_workout(day, workout, exercise)
+        else:
+            # Move a row to another day, which both the old and the new entry depend on
+            moved = rng.randint(-3, 3)
+            data_handler._pool.write(lambda conn: conn.execute(
+                "UPDATE OR IGNORE History SET date = date + ? WHERE id = (SELECT MIN(id) FROM History)", (moved,)))
+        if step % 25 == 0:
+            assert stats_rows(data_handler) == recomputed_stats(data_handler)
+    assert stats_rows(data_handler) == recomputed_stats(data_handler)
+
+def test_deleting_the_last_entry_drops_the_stats(data_handler):
+    data_handler.save_workout('2024-03-01', 'Push', 'Bench', 3, 8, 60)
+    assert data_handler.get_exercise_stats('Push', 'Bench')['Sessions'] == 1
+    data_handler.delete_workout('2024-03-01', 'Push', 'Bench')
+    assert data_handler.get_exercise_stats('Push', 'Bench') is None
+    assert stats_rows(data_handler) == []
@@ -0,0 +1,35 @@
+import pytest
+
+PUSH = ['Shoulder', 'Bench', 'Incline bench', 'Triceps', 'Horizontal Raises']
+
+@pytest.fixture
+def logged(data_handler):
+    """Five Push exercises logged on each of three days"""
+    data_handler.save_many(
+        (f'2024-05-0{day}', 'Push', exercise, 3, 8, 20.0 + day)
+        for day in (1, 2, 3)
+        for exercise in PUSH
+    )
+    return data_handler
+
+def rows(columns):
+    return list(zip(columns.days.tolist(), columns.workouts, columns.exercises))
+
+@pytest.mark.parametrize('ascending', [True, False])
+def test_limit_offset_pages_cover_every_row_once(logged, ascending):
+    everything = rows(logged.get_history_columns(ascending=ascending))
+    pages = []
+    for offset in range(0, len(everything), 4):
+        pages += rows(logged.get_history_columns(limit=4, offset=offset, ascending=ascending))
+    assert pages == everything
+    assert len(set(pages)) == 15
+
+def test_keyset_pages_of_an_exercise(logged):
+    first = logged.get_history_columns('Push', 'Bench', limit=2)
+    second = logged.get_history_columns('Push', 'Bench', before=int(first.days[-1]), limit=2)
+    assert len(first) == 2 and len(second) == 1
+    assert second.days[0] < first.days[-1]
+
+def test_keyset_paging_needs_an_exercise(logged):
+    with pytest.raises(ValueError):
+        logged.get_history_columns(before='2024-05-03', limit=4)
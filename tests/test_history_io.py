@@ -0,0 +1,77 @@
+import csv
+
+import pytest
+
+from data_handler import DataHandler, ImportResult
+
+ENTRIES = [
+    ('2024-01-05', 'Push', 'Bench', 3, 8, 60.0),
+    ('2024-01-05', 'Pull', 'Row', 4, 10, 50.0),
+    ('2024-01-12', 'Push', 'Bench', 3, 8, 62.5),
+]
+
+@pytest.fixture
+def other(tmp_path):
+    """A handler on a second, new database to import into"""
+    data_handler = DataHandler(str(tmp_path / 'other.db'))
+    yield data_handler
+    data_handler.close()
+
+@pytest.mark.parametrize('name', ['history.csv', 'history.parquet'])
+def test_export_import_round_trip(data_handler, other, tmp_path, name):
+    if name.endswith('.parquet'):
+        pytest.importorskip('pyarrow')
+    data_handler.add_exercises([('Arms', 'Curl')])
+    data_handler.save_many(ENTRIES + [('2024-01-06', 'Arms', 'Curl', 3, 12, 12.5)])
+    data_handler.save_sets('2024-01-06', 'Push', 'Triceps', [(12, 15, 7.5), (10, 17.25), (8, 17.25, 10)])
+    path = str(tmp_path / name)
+
+    assert data_handler.export_history(path, chunk_size=2) == 5
+    assert other.import_history(path, chunk_size=2) == ImportResult(5, 0)
+    assert other.get_history(ascending=True).equals(data_handler.get_history(ascending=True))
+    for workout, exercise in [('Push', 'Bench'), ('Push', 'Triceps')]:
+        assert other.get_exercise_stats(workout, exercise) == data_handler.get_exercise_stats(workout, exercise)
+    # The sets and their exact volume come back, not just the rollup
+    assert other.get_sets('2024-01-06', 'Push', 'Triceps') == data_handler.get_sets('2024-01-06', 'Push', 'Triceps')
+    assert other.get_history('Push', 'Triceps')['Volume'][0] == 12 * 15 + 10 * 17.25 + 8 * 17.25
+
+def test_import_skips_exercises_of_another_workout(data_handler, tmp_path):
+    path = str(tmp_path / 'history.csv')
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Date', 'Workout', 'Exercise', 'Sets', 'Reps', 'Weight'])
+        writer.writerows([
+            ('2024-01-05', 'Push', 'Bench', 3, 8, 60),
+            # Bench belongs to Push, so this row is skipped and no Legs/Bench is made
+            ('2024-01-05', 'Legs', 'Bench', 3, 8, 70),
+            ('2024-01-06', 'Arms', 'Curl', 3, 12, 12.5),
+            ('06/01/2024', 'Arms', 'Curl', 3, 12, 15),
+        ])
+
+    assert data_handler.import_history(path) == ImportResult(3, 1)
+    assert data_handler.get_current_workout('2024-01-05', 'Push', 'Bench').weight == 60
+    # The later row of a day wins
+    assert data_handler.get_current_workout('2024-01-06', 'Arms', 'Curl').weight == 15
+    assert list(data_handler.get_exercises_by_workout('Arms')) == ['Curl']
+    assert list(data_handler.get_exercises_by_workout('Push')).count('Bench') == 1
+
+def test_set_list_column(data_handler, tmp_path):
+    path = str(tmp_path / 'history.csv')
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Date', 'Workout', 'Exercise', 'Sets', 'Reps', 'Weight', 'SetList'])
+        writer.writerows([
+            # The rollup columns of a row with sets are worked out again
+            ('2024-01-05', 'Push', 'Bench', 1, 1, 1, '8x60@8;6x70'),
+            ('2024-01-05', 'Push', 'Shoulder', 3, 10, 20, ''),
+        ])
+
+    assert data_handler.import_history(path) == ImportResult(2, 0)
+    assert data_handler.get_sets('2024-01-05', 'Push', 'Bench') == [(8, 60.0, 8.0), (6, 70.0, None)]
+    assert data_handler.get_current_workout('2024-01-05', 'Push', 'Bench')[1:] == (2, 6, 70.0)
+    assert data_handler.get_sets('2024-01-05', 'Push', 'Shoulder') == [(10, 20.0, None)] * 3
+
+    export_path = str(tmp_path / 'export.csv')
+    data_handler.export_history(export_path)
+    with open(export_path, newline='') as file:
+        assert [row['SetList'] for row in csv.DictReader(file)] == ['', '8x60@8;6x70']
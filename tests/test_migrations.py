@@ -0,0 +1,108 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from data_handler import MIGRATIONS, WORKOUTS_EXERCISES, DataHandler
+from dates import to_day
+
+# The schema as the app created it before migrations, with dates stored as text
+BASELINE_SCHEMA = """
+CREATE TABLE Workouts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE Exercises (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    workout_id INTEGER NOT NULL,
+    name TEXT NOT NULL UNIQUE,
+    FOREIGN KEY (workout_id) REFERENCES Workouts(id) ON DELETE CASCADE
+);
+CREATE TABLE History (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date DATE NOT NULL,
+    workout_id INTEGER NOT NULL,
+    exercise_id INTEGER NOT NULL,
+    sets INTEGER NOT NULL,
+    reps INTEGER NOT NULL,
+    weight REAL NOT NULL,
+    FOREIGN KEY (workout_id) REFERENCES Workouts(id) ON DELETE CASCADE,
+    FOREIGN KEY (exercise_id) REFERENCES Exercises(id) ON DELETE CASCADE,
+    UNIQUE(date, workout_id, exercise_id)
+);
+CREATE TABLE Max (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    workout_id INTEGER NOT NULL,
+    exercise_id INTEGER NOT NULL,
+    max INTEGER NOT NULL,
+    FOREIGN KEY (workout_id) REFERENCES Workouts(id) ON DELETE CASCADE,
+    FOREIGN KEY (exercise_id) REFERENCES Exercises(id) ON DELETE CASCADE,
+    UNIQUE(workout_id, exercise_id)
+);
+"""
+
+BASELINE_HISTORY = [
+    ('2024-01-02', 'Push', 'Bench', 3, 8, 60.0),
+    ('2024-01-09 18:30:00', 'Push', 'Bench', 3, 6, 70.0),
+    ('2024-01-03', 'Pull', 'Row', 4, 10, 50.0),
+    # Two entries of one day, only one survives the conversion
+    ('2024-01-10', 'Pull', 'Row', 4, 10, 52.5),
+    ('2024-01-10 07:00:00', 'Pull', 'Row', 4, 10, 52.5),
+]
+
+@pytest.fixture
+def baseline_path(tmp_path):
+    """A database as the app left it before migrations, with text dates"""
+    path = str(tmp_path / 'data.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    for workout, exercise in WORKOUTS_EXERCISES:
+        conn.execute("INSERT OR IGNORE INTO Workouts (name) VALUES (?)", (workout,))
+        conn.execute("INSERT INTO Exercises (workout_id, name) SELECT id, ? FROM Workouts WHERE name = ?", (exercise, workout))
+    conn.executemany("""
+    INSERT INTO History (date, workout_id, exercise_id, sets, reps, weight)
+    SELECT ?, workout_id, id, ?, ?, ? FROM Exercises WHERE name = ?
+    """, [(day, sets, reps, weight, exercise) for day, _, exercise, sets, reps, weight in BASELINE_HISTORY])
+    conn.commit()
+    conn.close()
+    return path
+
+def test_baseline_history_becomes_day_numbers(baseline_path):
+    data_handler = DataHandler(baseline_path)
+    try:
+        with data_handler._pool.reader() as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+            rows = conn.execute("""
+            SELECT History.date, typeof(History.date), Exercises.name
+            FROM History JOIN Exercises ON Exercises.id = History.exercise_id
+            ORDER BY History.date
+            """).fetchall()
+        assert rows == [
+            (to_day(date(2024, 1, 2)), 'integer', 'Bench'),
+            (to_day(date(2024, 1, 3)), 'integer', 'Row'),
+            (to_day(date(2024, 1, 9)), 'integer', 'Bench'),
+            (to_day(date(2024, 1, 10)), 'integer', 'Row'),
+        ]
+
+        assert data_handler.get_exercise_stats('Push', 'Bench') == {
+            'FirstDate': date(2024, 1, 2), 'FirstWeight': 60.0,
+            'LastDate': date(2024, 1, 9), 'LastWeight': 70.0,
+            'BestWeight': 70.0, 'BestE1RM': pytest.approx(70 * (1 + 6 / 30)),
+            'Sessions': 2, 'Volume': 3 * 8 * 60 + 3 * 6 * 70
+        }
+        row_stats = data_handler.get_exercise_stats('Pull', 'Row')
+        assert (row_stats['Sessions'], row_stats['Volume'], row_stats['LastDate']) == (2, 4 * 10 * 50 + 4 * 10 * 52.5, date(2024, 1, 10))
+        assert data_handler.get_current_workout('2024-01-09', 'Push', 'Bench').weight == 70.0
+    finally:
+        data_handler.close()
+
+def test_text_dates_are_refused_after_migrating(baseline_path):
+    DataHandler(baseline_path).close()
+    conn = sqlite3.connect(baseline_path)
+    try:
+        with pytest.raises(sqlite3.IntegrityError, match='day number'):
+            conn.execute("INSERT INTO History (date, workout_id, exercise_id, sets, reps, weight) VALUES ('2024-02-01', 1, 1, 3, 8, 60)")
+        with pytest.raises(sqlite3.IntegrityError, match='day number'):
+            conn.execute("UPDATE History SET date = '2024-02-01'")
+    finally:
+        conn.close()
@@ -0,0 +1,41 @@
+import pytest
+
+from data_handler import DataHandler
+
+@pytest.fixture
+def other(tmp_path, data_handler):
+    """A second handler on the same database, like another process"""
+    other = DataHandler(str(tmp_path / 'data.db'))
+    yield other
+    other.close()
+
+def test_writes_of_another_handler_expire_the_cache(data_handler, other):
+    data_handler.save_workout('2024-01-05', 'Push', 'Bench', 3, 8, 60)
+    assert data_handler.get_current_workout('2024-01-05', 'Push', 'Bench').weight == 60
+    assert len(data_handler.get_history('Push', 'Bench')) == 1
+    revision = data_handler.get_exercise_revision('Push', 'Bench')
+
+    other.save_workout('2024-01-05', 'Push', 'Bench', 3, 8, 70)
+    other.save_workout('2024-01-06', 'Push', 'Bench', 3, 8, 75)
+    other.save_max('Push', 'Bench', 90)
+
+    assert data_handler.get_current_workout('2024-01-05', 'Push', 'Bench').weight == 70
+    assert list(data_handler.get_history('Push', 'Bench')['Weight']) == [75, 70]
+    assert data_handler.get_exercise_revision('Push', 'Bench') > revision
+    assert data_handler.get_max('Push', 'Bench') == 90
+
+def test_own_writes_only_expire_what_they_touched(data_handler):
+    data_handler.get_current_workout('2024-01-05', 'Push', 'Shoulder')
+    data_handler.save_workout('2024-01-05', 'Push', 'Bench', 3, 8, 60)
+    assert data_handler.get_current_workout('2024-01-05', 'Push', 'Bench').weight == 60
+
+    hits = data_handler.cache_stats()['hits']
+    data_handler.get_current_workout('2024-01-05', 'Push', 'Shoulder')
+    assert data_handler.cache_stats()['hits'] == hits + 1
+
+def test_another_handler_writing_between_own_writes(data_handler, other):
+    data_handler.get_current_workout('2024-01-05', 'Push', 'Shoulder')
+    data_handler.save_workout('2024-01-05', 'Push', 'Bench', 3, 8, 60)
+    other.save_workout('2024-01-05', 'Push', 'Shoulder', 3, 8, 20)
+    data_handler.save_workout('2024-01-05', 'Push', 'Bench', 3, 8, 65)
+    assert data_handler.get_current_workout('2024-01-05', 'Push', 'Shoulder').weight == 20
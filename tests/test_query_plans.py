@@ -0,0 +1,50 @@
+import pytest
+
+def query_plans(data_handler, read):
+    """Get the EXPLAIN QUERY PLAN details of every query read() runs"""
+    queries = []
+    fetchall = data_handler._fetchall
+
+    def recording_fetchall(query, params=()):
+        queries.append((query, params))
+        return fetchall(query, params)
+
+    data_handler._fetchall = recording_fetchall
+    try:
+        read()
+    finally:
+        data_handler._fetchall = fetchall
+
+    with data_handler._pool.reader() as conn:
+        return [
+            [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+            for query, params in queries
+            if 'History' in query
+        ]
+
+@pytest.fixture
+def uncached(tmp_path):
+    from data_handler import DataHandler
+    # Without the query cache every read runs its query
+    data_handler = DataHandler(str(tmp_path / 'data.db'), cache_size=0)
+    data_handler.save_workout('2024-01-01', 'Push', 'Bench', 3, 8, 60)
+    yield data_handler
+    data_handler.close()
+
+def test_last_workout_seeks_the_exercise_index(uncached):
+    plans = query_plans(uncached, lambda: uncached.get_last_workout('2024-01-05', 'Push', 'Bench'))
+    assert plans == [['SEARCH History USING COVERING INDEX History_exercise_date (exercise_id=? AND date<?)']]
+
+@pytest.mark.parametrize('workout', [None, 'Push'])
+def test_snapshot_last_entry_seeks_the_exercise_index(uncached, workout):
+    plans = query_plans(uncached, lambda: uncached.get_day_snapshot('2024-01-05', workout))
+    assert len(plans) == 1
+    plan = plans[0]
+    # The per-exercise last entry subquery and the current entry are index seeks
+    assert 'SEARCH History USING COVERING INDEX History_exercise_date (exercise_id=? AND date<?)' in plan
+    assert any(detail.startswith('SEARCH Current USING INDEX') for detail in plan)
+    assert not any(detail.startswith('SCAN History') or detail.startswith('SCAN Current') for detail in plan)
+
+def test_exercise_history_is_covered_by_the_exercise_index(uncached):
+    plans = query_plans(uncached, lambda: uncached.get_history_columns('Push', 'Bench', ascending=True))
+    assert plans[0][0].startswith('SEARCH History USING COVERING INDEX History_exercise_date')
@@ -0,0 +1,8 @@
+from benchmarks.stress import run_stress
+
+def test_concurrent_sessions(tmp_path):
+    report = run_stress(str(tmp_path / 'data.db'), sessions=8, seconds=1)
+    assert report['errors'] == {}
+    assert report['operations'] > 0
+    assert report['stats_consistent']
+    assert report['cache_consistent']
@@ -0,0 +1,68 @@
+import sqlite3
+import threading
+
+import pytest
+
+from data_handler import DataHandler
+from dates import to_day
+
+@pytest.fixture
+def write_behind(tmp_path):
+    data_handler = DataHandler(str(tmp_path / 'data.db'), write_behind=True)
+    yield data_handler
+    data_handler.close()
+
+@pytest.fixture
+def blocked_writer(write_behind):
+    """Hold the writer thread until set, so queued writes stay pending"""
+    release = threading.Event()
+    write_behind._pool.submit(lambda conn: release.wait(10))
+    yield release
+    release.set()
+
+def committed_weight(data_handler, day, exercise):
+    with data_handler._pool.reader() as conn:
+        row = conn.execute("""
+        SELECT weight FROM History JOIN Exercises ON Exercises.id = History.exercise_id
+        WHERE History.date = ? AND Exercises.name = ?
+        """, (to_day(day), exercise)).fetchone()
+    return None if row is None else row[0]
+
+def test_pending_writes_are_read_back(write_behind, blocked_writer):
+    write_behind.save_workout('2024-01-05', 'Push', 'Bench', 3, 8, 60)
+    write_behind.save_max('Push', 'Bench', 80)
+    with write_behind.batch() as batch:
+        batch.save_workout('2024-01-05', 'Push', 'Shoulder', 3, 10, 20)
+    assert batch.changes is None
+    # Nothing is committed yet
+    assert committed_weight(write_behind, '2024-01-05', 'Bench') is None
+
+    assert write_behind.get_current_workout('2024-01-05', 'Push', 'Bench').weight == 60
+    snapshot = write_behind.get_day_snapshot('2024-01-05', 'Push')
+    assert snapshot[('Push', 'Bench')]['Current'].weight == 60
+    assert snapshot[('Push', 'Bench')]['Max'] == 80
+    assert snapshot[('Push', 'Shoulder')]['Current'].weight == 20
+
+    # A queued delete hides the entry too
+    write_behind.delete_workout('2024-01-05', 'Push', 'Bench')
+    assert write_behind.get_current_workout('2024-01-05', 'Push', 'Bench') is None
+    assert write_behind.get_day_snapshot('2024-01-05', 'Push')[('Push', 'Bench')]['Current'] is None
+
+    blocked_writer.set()
+    write_behind.flush()
+    assert committed_weight(write_behind, '2024-01-05', 'Bench') is None
+    assert committed_weight(write_behind, '2024-01-05', 'Shoulder') == 20
+    assert write_behind.get_day_snapshot('2024-01-05', 'Push')[('Push', 'Shoulder')]['Current'].weight == 20
+
+def test_flush_raises_a_failed_write(write_behind, blocked_writer):
+    # sets is NOT NULL, so the commit fails after the save returned
+    assert write_behind.save_workout('2024-01-05', 'Push', 'Bench', None, 8, 60) is None
+    write_behind.save_workout('2024-01-05', 'Push', 'Shoulder', 3, 10, 20)
+    blocked_writer.set()
+
+    with pytest.raises(sqlite3.IntegrityError):
+        write_behind.flush()
+    # The failed write is reported once and no longer read back, the other one committed
+    write_behind.flush()
+    assert write_behind.get_current_workout('2024-01-05', 'Push', 'Bench') is None
+    assert write_behind.get_current_workout('2024-01-05', 'Push', 'Shoulder').weight == 20
@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+from collections import deque
+
+class RerunTrace:
+    """Statement and DataFrame timings collected during one Streamlit rerun"""
+    def __init__(self, number, label):
+        self.number = number
+        self.label = label
+        self.started = time.time()
+        self.seconds = None
+        # Normalized SQL -> [count, seconds, rows]
+        self.statements = {}
+        self.frames = [0, 0.0, 0]
+
+    def add_statement(self, statement, seconds, rows):
+        totals = self.statements.get(statement)
+        if totals is None:
+            totals = self.statements[statement] = [0, 0.0, 0]
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] += rows
+
+    def to_dict(self):
+        """Get the trace as plain data, slowest statements first"""
+        statements = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            'rerun': self.number,
+            'label': self.label,
+            'started': self.started,
+            'seconds': self.seconds,
+            'query_count': sum(totals[0] for _, totals in statements),
+            'query_seconds': sum(totals[1] for _, totals in statements),
+            'frame_count': self.frames[0],
+            'frame_seconds': self.frames[1],
+            'frame_rows': self.frames[2],
+            'statements': [
+                {'sql': statement, 'count': count, 'seconds': seconds, 'rows': rows}
+                for statement, (count, seconds, rows) in statements
+            ]
+        }
+
+class QueryTracer:
+    """Collects per-rerun query and DataFrame timings from a DataHandler
+
+    Only threads inside start_rerun/end_rerun are traced, so a shared
+    DataHandler costs other sessions a single thread-local lookup.
+    """
+    def __init__(self, history=50, export_path=None):
+        self.reruns = deque(maxlen=history)
+        self.export_path = export_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._count = 0
+        self._normalized = {}
+
+    def current(self):
+        """Get the trace of the rerun running on this thread, None when not tracing"""
+        return getattr(self._local, 'rerun', None)
+
+    def start_rerun(self, label=None):
+        """Start collecting for the rerun running on this thread"""
+        with self._lock:
+            self._count += 1
+            number = self._count
+        self._local.rerun = RerunTrace(number, label)
+        self._local.start = time.perf_counter()
+        return self._local.rerun
+
+    def end_rerun(self):
+        """Stop collecting on this thread, returns the finished trace"""
+        rerun = self.current()
+        if rerun is None:
+            return None
+        rerun.seconds = time.perf_counter() - self._local.start
+        self._local.rerun = None
+
+        with self._lock:
+            self.reruns.append(rerun)
+            if self.export_path is not None:
+                with open(self.export_path, 'a') as file:
+                    file.write(json.dumps(rerun.to_dict()) + '\n')
+        return rerun
+
+    def record_query(self, rerun, query, seconds, rows):
+        """Add one statement execution to a rerun"""
+        statement = self._normalized.get(query)
+        if statement is None:
+            statement = self._normalized[query] = ' '.join(query.split())
+        rerun.add_statement(statement, seconds, rows)
+
+    def record_frame(self, rerun, seconds, rows):
+        """Add one DataFrame build to a rerun"""
+        rerun.frames[0] += 1
+        rerun.frames[1] += seconds
+        rerun.frames[2] += rows
+
+    def to_jsonl(self):
+        """Get the kept reruns as JSON lines"""
+        with self._lock:
+            reruns = list(self.reruns)
+        return ''.join(json.dumps(rerun.to_dict()) + '\n' for rerun in reruns)
@@ -1,26 +1,23 @@
 import streamlit as st
-import pandas as pd
+from dates import to_day, from_day
 
 def initialize_session_state():
     """Initialize session state variables"""
     if 'workout_added' not in st.session_state:
         st.session_state.workout_added = False
 
-def calculate_progress(history_df, workout, exercise):
-    """Calculate progress metrics for an exercise"""
-    if history_df.empty:
+def progress_from_stats(stats):
+    """Calculate progress metrics from the precomputed exercise stats"""
+    if stats is None:
         return None, None
-    
-    exercise_data = history_df[(history_df['Workout'] == workout) & (history_df['Exercise'] == exercise)].sort_values('Date')
-    if len(exercise_data) < 2:
-        return None, None
-    
-    first_weight = exercise_data.iloc[0]['Weight']
-    last_weight = exercise_data.iloc[-1]['Weight']
-    progress = ((last_weight - first_weight) / first_weight) * 100
-    
+
+    last_weight = stats['LastWeight']
+    if stats['Sessions'] < 2 or not stats['FirstWeight']:
+        return last_weight, None
+
+    progress = ((last_weight - stats['FirstWeight']) / stats['FirstWeight']) * 100
     return last_weight, progress
 
-def format_date(date_str):
-    """Format date string for display"""
-    return pd.to_datetime(date_str).strftime('%d/%m/%Y')
\ No newline at end of file
+def format_date(value):
+    """Format a date, date string or day number for display"""
+    return from_day(to_day(value)).strftime('%d/%m/%Y')
\ No newline at end of file
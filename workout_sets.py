@@ -0,0 +1,69 @@
+import math
+import struct
+from collections import namedtuple
+
+# One set of an exercise on a day, rpe is None when it was not logged
+WorkoutSet = namedtuple('WorkoutSet', ['reps', 'weight', 'rpe'], defaults=[None])
+
+# A set packs to 7 bytes: reps, the weight in hundredths of a kg and the RPE in
+# tenths, 0 meaning none. A session's sets are stored back to back in one BLOB.
+SET_FORMAT = struct.Struct('<HiB')
+
+# The most each field packs
+MAX_REPS = 2 ** 16 - 1
+MAX_WEIGHT = (2 ** 31 - 1) / 100
+
+def pack_sets(sets):
+    """Pack a list of WorkoutSet or (reps, weight[, rpe]) into bytes"""
+    packed = bytearray()
+    for workout_set in sets:
+        reps, weight, rpe = WorkoutSet(*workout_set)
+        if (not 1 <= reps <= MAX_REPS or not (math.isfinite(weight) and 0 <= weight <= MAX_WEIGHT)
+                or (rpe is not None and not 1 <= rpe <= 10)):
+            raise ValueError(f"Invalid set {tuple(workout_set)}, reps must be 1 to {MAX_REPS}, "
+                             f"weight 0 to {MAX_WEIGHT:.0f} kg and RPE 1 to 10")
+        packed += SET_FORMAT.pack(int(reps), round(weight * 100), 0 if rpe is None else round(rpe * 10))
+    return bytes(packed)
+
+def unpack_sets(packed):
+    """Get the WorkoutSet list of bytes made by pack_sets"""
+    return [
+        WorkoutSet(reps, weight / 100, rpe / 10 if rpe else None)
+        for reps, weight, rpe in SET_FORMAT.iter_unpack(packed)
+    ]
+
+def rollup_sets(sets):
+    """Summarize sets as the (sets, reps, weight, volume) of a History row
+
+    The weight is the heaviest set and the reps the most done at it, so the
+    best weight and estimated 1RM of the exercise stay those of its top set.
+    The volume is the exact sum over the sets.
+    """
+    sets = [WorkoutSet(*workout_set) for workout_set in sets]
+    weight = max(workout_set.weight for workout_set in sets)
+    reps = max(workout_set.reps for workout_set in sets if workout_set.weight == weight)
+    volume = sum(workout_set.reps * workout_set.weight for workout_set in sets)
+    return len(sets), reps, weight, volume
+
+def _number_text(value, places):
+    """Write a number with at most places decimals and no trailing zeros"""
+    return f"{value:.{places}f}".rstrip('0').rstrip('.')
+
+def format_sets(sets):
+    """Write sets as text, reps x weight @ RPE joined by ';' like 8x60@8;12x40"""
+    return ';'.join(
+        f"{reps}x{_number_text(weight, 2)}" + ("" if rpe is None else f"@{_number_text(rpe, 1)}")
+        for reps, weight, rpe in (WorkoutSet(*workout_set) for workout_set in sets)
+    )
+
+def parse_sets(text):
+    """Get the WorkoutSet list of text written by format_sets"""
+    sets = []
+    for part in text.split(';'):
+        try:
+            reps, weight = part.split('x')
+            weight, _, rpe = weight.partition('@')
+            sets.append(WorkoutSet(int(reps), float(weight), float(rpe) if rpe.strip() else None))
+        except ValueError:
+            raise ValueError(f"Invalid set '{part.strip()}' in '{text}', expected reps x weight like 8x60 or 8x60@8")
+    return sets